@@ -30,12 +30,13 @@ config_info = dict(
     ),
     Display=dict(
         interpolation_type=dict(obj="options", type=eval, values=DISPLAY_INTERPOLATION_TYPES, default="cv2.INTER_LINEAR"),
-        fast_loading_threshold_ms=dict(obj="entry", type=int, default=100),
         ctk_corner_radius=dict(obj="entry", type=int, default=3),
-        search_grid_preview_row_height=dict(obj="options", type=int, values=["75", "100", "125"], default="75")
+        search_grid_preview_row_height=dict(obj="options", type=int, values=["75", "100", "125"], default="75"),
+        concat_layout=dict(obj="options", type=str, values=["grid", "row"], default="grid"),
     ),
     Zoom=dict(
         interpolation_type=dict(obj="options", type=eval, values=ZOOM_INTERPOLATION_TYPES, default="cv2.INTER_NEAREST"),
+        keep_high_bit_depth=dict(obj="options", type=bool, values=["true", "false"], default="false"),
     ),
     Functionality=dict(
         max_fps=dict(obj="entry", type=int, default=60),
@@ -58,7 +59,24 @@ config_info = dict(
     ),
     Color=dict(
         correct_h264_bt709=dict(obj="options", type=bool, values=["true", "false"], default="false")
-    )
+    ),
+    Cache=dict(
+        directory=dict(obj="entry", type=str, default="~/.cache/visual_comparison"),
+        use_catalog=dict(obj="options", type=bool, values=["true", "false"], default="true"),
+        image_cache_mb=dict(obj="entry", type=int, default=1024),
+    ),
+    Prefetch=dict(
+        files_ahead=dict(obj="entry", type=int, default=2),
+        files_behind=dict(obj="entry", type=int, default=1),
+    ),
+    Playback=dict(
+        decode_ahead_frames=dict(obj="entry", type=int, default=8),
+        history_mb=dict(obj="entry", type=int, default=512),
+    ),
+    Proxy=dict(
+        use_proxies=dict(obj="options", type=bool, values=["true", "false"], default="false"),
+        height=dict(obj="entry", type=int, default=1080),
+    ),
 )
 
 
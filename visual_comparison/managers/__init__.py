@@ -1,5 +1,11 @@
+from .catalog import *
+from .compositor import *
 from .content_manager import *
-from .fast_load_checker import *
 from .icon_manager import *
+from .load_scheduler import *
+from .metadata_manager import *
+from .prefetch_manager import *
+from .proxy_manager import *
+from .stream_decoder import *
 from .video_writer import *
 from .zoom_manager import *
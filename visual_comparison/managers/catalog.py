@@ -0,0 +1,224 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+__all__ = ["Catalog"]
+
+
+class Catalog:
+    """
+    Persistent on-disk index of a root folder, stored as a SQLite file in the cache directory and keyed by the absolute
+    path of the root. Holds folder listings, resolved file paths, sizes/mtimes, ffprobe metadata, preview rows,
+    pre-encoded thumbnails (one per size tier) and video keyframe indices so that reopening an unchanged root does not
+    need to list, glob, probe or decode anything.
+
+    Every record stores the size and mtime of the file it was computed from. Callers are responsible for validating
+    records against the file system (see Catalog.is_valid) before using them.
+    """
+    VERSION = 5
+
+    def __init__(self, root: str, cache_dir: str):
+        """
+        :param root: Root folder with sub-folders containing images to compare
+        :param cache_dir: Directory to store catalog files in
+        """
+        catalog_dir = os.path.join(cache_dir, "catalogs")
+        os.makedirs(catalog_dir, exist_ok=True)
+
+        root_key = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()
+        self.path = os.path.join(catalog_dir, f"{root_key}.sqlite")
+        self.root = root
+
+        # Worker threads may write results, so serialize access to the connection ourselves.
+        self.lock = threading.Lock()
+        try:
+            self.connection = self._connect()
+        except sqlite3.DatabaseError:
+            # Corrupted catalog, start afresh
+            os.remove(self.path)
+            self.connection = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        row = connection.execute("SELECT value FROM info WHERE key = 'version'").fetchone()
+
+        # Outdated catalog layout, drop everything and rebuild
+        if row is None or int(row[0]) != self.VERSION:
+            for table in ("folders", "files", "previews", "thumbnails", "keyframes"):
+                connection.execute(f"DROP TABLE IF EXISTS {table}")
+            connection.execute("INSERT OR REPLACE INTO info VALUES ('version', ?)", (str(self.VERSION),))
+
+        connection.execute("CREATE TABLE IF NOT EXISTS folders (method TEXT PRIMARY KEY, mtime_ns INTEGER, names TEXT)")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "method TEXT, name TEXT, path TEXT, ext TEXT, size INTEGER, mtime_ns INTEGER, metadata TEXT, "
+            "PRIMARY KEY (method, name))"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS previews ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, color_conversion INTEGER, data TEXT)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS thumbnails ("
+            "path TEXT, tier INTEGER, size INTEGER, mtime_ns INTEGER, color_conversion INTEGER, thumbnail BLOB, "
+            "PRIMARY KEY (path, tier))"
+        )
+        connection.execute("CREATE TABLE IF NOT EXISTS keyframes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, keyframes TEXT)")
+        connection.commit()
+        return connection
+
+    @staticmethod
+    def stat(path: str) -> Optional[Tuple[int, int]]:
+        """
+        :param path: Path to file or folder
+        :return: (size, mtime_ns), or None if the path does not exist
+        """
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        return stat_result.st_size, stat_result.st_mtime_ns
+
+    @staticmethod
+    def is_valid(record: Optional[dict], stat: Optional[Tuple[int, int]]) -> bool:
+        """
+        Checks whether a catalog record still describes the file on disk.
+        :param record: Record returned by one of the get methods
+        :param stat: Return value of Catalog.stat for the record's path
+        """
+        if record is None or stat is None:
+            return False
+        return (record["size"], record["mtime_ns"]) == stat
+
+    def get_listing(self, method: str, mtime_ns: int) -> Optional[List[str]]:
+        """
+        :param method: Method (folder) name
+        :param mtime_ns: Current mtime of the folder. Listing is only returned if it matches.
+        :return: List of file names in the folder or None if not cached / outdated
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT mtime_ns, names FROM folders WHERE method = ?", (method,)).fetchone()
+        if row is None or row[0] != mtime_ns:
+            return None
+        return json.loads(row[1])
+
+    def put_listing(self, method: str, mtime_ns: int, names: List[str]) -> None:
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)", (method, mtime_ns, json.dumps(names)))
+            self.connection.commit()
+
+    def get_files(self, method: str) -> Dict[str, dict]:
+        """
+        :param method: Method (folder) name
+        :return: Dictionary mapping file name (without extension) to its record
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT name, path, ext, size, mtime_ns, metadata FROM files WHERE method = ?", (method,)
+            ).fetchall()
+
+        records = {}
+        for name, path, ext, size, mtime_ns, metadata in rows:
+            metadata = None if metadata is None else json.loads(metadata)
+            records[name] = dict(path=path, ext=ext, size=size, mtime_ns=mtime_ns, metadata=metadata)
+        return records
+
+    def put_files(self, method: str, records: Dict[str, dict]) -> None:
+        """
+        :param method: Method (folder) name
+        :param records: Dictionary mapping file name to dict(path, size, mtime_ns, metadata)
+        """
+        rows = []
+        for name, record in records.items():
+            metadata = None if record["metadata"] is None else json.dumps(record["metadata"])
+            ext = os.path.splitext(record["path"])[-1].lower()
+            rows.append((method, name, record["path"], ext, record["size"], record["mtime_ns"], metadata))
+
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.commit()
+
+    def get_previews(self) -> Dict[str, dict]:
+        """
+        :return: Dictionary mapping file path to dict(size, mtime_ns, color_conversion, data)
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT path, size, mtime_ns, color_conversion, data FROM previews").fetchall()
+
+        records = {}
+        for path, size, mtime_ns, color_conversion, data in rows:
+            records[path] = dict(size=size, mtime_ns=mtime_ns, color_conversion=bool(color_conversion), data=json.loads(data))
+        return records
+
+    def put_previews(self, records: Dict[str, dict]) -> None:
+        """
+        :param records: Dictionary mapping file path to dict(size, mtime_ns, color_conversion, data)
+        """
+        rows = []
+        for path, record in records.items():
+            rows.append((path, record["size"], record["mtime_ns"], int(record["color_conversion"]), json.dumps(record["data"])))
+
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO previews VALUES (?, ?, ?, ?, ?)", rows)
+            self.connection.commit()
+
+    def get_thumbnails(self, tier: int) -> Dict[str, dict]:
+        """
+        :param tier: Thumbnail height
+        :return: Dictionary mapping file path to dict(size, mtime_ns, color_conversion, thumbnail). Thumbnail is encoded.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT path, size, mtime_ns, color_conversion, thumbnail FROM thumbnails WHERE tier = ?", (tier,)
+            ).fetchall()
+
+        records = {}
+        for path, size, mtime_ns, color_conversion, thumbnail in rows:
+            records[path] = dict(size=size, mtime_ns=mtime_ns, color_conversion=bool(color_conversion), thumbnail=thumbnail)
+        return records
+
+    def put_thumbnails(self, records: Dict[str, dict]) -> None:
+        """
+        :param records: Dictionary mapping file path to dict(size, mtime_ns, color_conversion, thumbnails), where
+            thumbnails maps each tier (thumbnail height) to the encoded thumbnail
+        """
+        rows = []
+        for path, record in records.items():
+            for tier, thumbnail in record["thumbnails"].items():
+                rows.append((path, tier, record["size"], record["mtime_ns"], int(record["color_conversion"]), thumbnail))
+
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.connection.commit()
+
+    def get_keyframes(self, path: str) -> Optional[dict]:
+        """
+        :param path: Path to video
+        :return: dict(size, mtime_ns, keyframes) or None if not cached
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT size, mtime_ns, keyframes FROM keyframes WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        return dict(size=row[0], mtime_ns=row[1], keyframes=json.loads(row[2]))
+
+    def put_keyframes(self, path: str, record: dict) -> None:
+        """
+        :param path: Path to video
+        :param record: dict(size, mtime_ns, keyframes)
+        """
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO keyframes VALUES (?, ?, ?, ?)",
+                (path, record["size"], record["mtime_ns"], json.dumps(record["keyframes"])),
+            )
+            self.connection.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,189 @@
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ..utils import image_utils
+
+
+__all__ = ["Compositor"]
+
+
+class Compositor:
+    """
+    Composes the displayed image from the frames of every method into persistent output buffers, which are only
+    reallocated when their shape changes. Frames are read only and are never drawn on, titles and zoom regions are
+    drawn on the output instead, so a static comparison does not allocate full frames on every display cycle.
+
+    Frames are composed at display size, see scale_images. Zoom crops are taken from the full resolution frames.
+    """
+    def __init__(self):
+        self.buffer = None  # Composed comparison
+        self.slots = []  # Views of buffer showing each frame, in display order
+        self.stacked_buffer = None  # Comparison with the zoom crop below it
+        self.source_buffer = None  # Full resolution comparison, only the zoomed region is composed, see merge_region
+        self.resized = dict()  # (identity, size, interpolation) -> (frame, resized frame) of the displayed frames
+
+        # Compare mode is updated incrementally while the frames stay the same
+        self.compared = None  # (frames, identity of frames, split position) of the last comparison in buffer
+        self.dirty = []  # (x0, y0, x1, y1) regions of buffer drawn on since, see mark_dirty
+
+    @staticmethod
+    def _get_buffer(buffer: Optional[np.array], shape: Tuple[int, ...], dtype: np.dtype) -> np.array:
+        """
+        :return: buffer if it matches shape and dtype, otherwise a new buffer
+        """
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def scale_images(self, images: List[np.array], scale: float, interpolation: Optional[int]) -> List[np.array]:
+        """
+        Resizes frames to the display scale. Resized frames are kept while they are displayed, so static frames are only
+        resized once per scale.
+        :param images: Full resolution frames
+        :param scale: Display scale
+        :param interpolation: cv2 interpolation type
+        :return: Read only resized frames, or images if scale is 1
+        """
+        if scale == 1:
+            self.resized = dict()
+            return images
+
+        resized = dict()
+        outputs = []
+        for image in images:
+            height, width = image.shape[:2]
+            size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+            key = (self._identify([image]), size, interpolation)
+            entry = self.resized.get(key, None)
+            if entry is None:
+                resized_image = cv2.resize(image, size, interpolation=interpolation)
+                resized_image.flags.writeable = False
+                # The frame is kept, so that its memory is not reused by another frame while in the cache
+                entry = (image, resized_image)
+            resized[key] = entry
+            outputs.append(entry[1])
+        self.resized = resized
+        return outputs
+
+    def concat(self, images: List[np.array], grid_shape: Optional[Tuple[int, int]] = None) -> np.array:
+        """
+        Places images side by side, or in a grid row by row.
+        :param images: Frames in display order, all with the same height. Same shape for more than one row.
+        :param grid_shape: [Optional] (rows, columns), a single row if None. Cells without an image are black.
+        :return: Composed image
+        """
+        height, channels = images[0].shape[0], images[0].shape[2]
+        rows, cols = grid_shape if grid_shape is not None else (1, len(images))
+        widths = [image.shape[1] for image in images] if rows == 1 else [images[0].shape[1]] * cols
+        self.buffer = self._get_buffer(self.buffer, (rows * height, sum(widths[:cols]), channels), images[0].dtype)
+        self.invalidate()
+
+        self.slots = []
+        offset_x = 0
+        for idx in range(rows * cols):
+            if idx % cols == 0:
+                offset_x = 0
+            offset_y, width = (idx // cols) * height, widths[idx % cols]
+            slot = self.buffer[offset_y: offset_y + height, offset_x: offset_x + width]
+            if idx < len(images):
+                np.copyto(slot, images[idx])
+                self.slots.append(slot)
+            else:
+                slot[...] = 0
+            offset_x += width
+        return self.buffer
+
+    def single(self, image: np.array) -> np.array:
+        """
+        :param image: Frame to display on its own
+        :return: Composed image
+        """
+        self.buffer = self._get_buffer(self.buffer, image.shape, image.dtype)
+        self.invalidate()
+        np.copyto(self.buffer, image)
+        self.slots = [self.buffer]
+        return self.buffer
+
+    @staticmethod
+    def _identify(images: List[np.array]) -> tuple:
+        """
+        Frames are read only views, a new view of the same frame has the same data, shape and strides
+        """
+        return tuple((image.__array_interface__["data"][0], image.shape, image.strides) for image in images)
+
+    def compare(self, images: List[np.array], position: Tuple[int, int]) -> np.array:
+        """
+        Splits the view between the images at position, see image_utils.merge_multiple_images.
+        If the frames are the same as in the last call, only the strips between the previous and the new split (up to
+        4 images, wedges of more images move as a whole) and the regions drawn on are written again.
+        :param images: Frames in display order
+        :param position: (x, y) to partition the images at
+        :return: Composed image
+        """
+        height, width = images[0].shape[:2]
+        prev_buffer = self.buffer
+        self.buffer = self._get_buffer(self.buffer, images[0].shape, images[0].dtype)
+        self.slots = [self.buffer]
+
+        identity = self._identify(images)
+        if self.buffer is not prev_buffer or self.compared is None or self.compared[1] != identity:
+            regions = [(0, 0, width, height)]
+        elif len(images) > 4 and self.compared[2] != position:
+            regions = [(0, 0, width, height)]
+        else:
+            (prev_x, prev_y), (x, y) = self.compared[2], position
+            regions = list(self.dirty)
+            if len(images) > 1 and prev_x != x:
+                regions.append((min(prev_x, x), 0, max(prev_x, x), height))
+            if len(images) > 2 and prev_y != y:
+                regions.append((0, min(prev_y, y), width, max(prev_y, y)))
+
+        for region in regions:
+            image_utils.merge_multiple_images(images, position, out=self.buffer, region=region)
+
+        # Frames are kept, so that their memory is not reused by other frames while compared by identity
+        self.compared = (images, identity, position)
+        self.dirty = []
+        return self.buffer
+
+    def merge_region(self, images: List[np.array], position: Tuple[int, int], region: Tuple[int, int, int, int]) -> np.array:
+        """
+        Composes only a region of a comparison, e.g. to crop a zoomed region from full resolution frames
+        :param images: Frames in display order
+        :param position: (x, y) to partition the images at
+        :param region: (x0, y0, x1, y1) to compose
+        :return: Buffer of the size of the images, only region is valid
+        """
+        self.source_buffer = self._get_buffer(self.source_buffer, images[0].shape, images[0].dtype)
+        return image_utils.merge_multiple_images(images, position, out=self.source_buffer, region=region)
+
+    def mark_dirty(self, region: Tuple[int, int, int, int]) -> None:
+        """
+        :param region: (x0, y0, x1, y1) of the composed image which was drawn on, e.g. by image_utils.put_text
+        """
+        self.dirty.append(region)
+
+    def invalidate(self) -> None:
+        """
+        The next comparison is composed in full, e.g. after drawing on an unknown part of the composed image
+        """
+        self.compared = None
+        self.dirty = []
+
+    def stack(self, image: np.array, cropped_image: Optional[np.array]) -> np.array:
+        """
+        :param image: Composed image, with titles and zoom regions drawn
+        :param cropped_image: [Optional] Zoomed crop to display below image, with the same width
+        :return: Image to display
+        """
+        if cropped_image is None:
+            return image
+
+        height = image.shape[0]
+        shape = (height + cropped_image.shape[0], *image.shape[1:])
+        self.stacked_buffer = self._get_buffer(self.stacked_buffer, shape, image.dtype)
+        self.stacked_buffer[:height] = image
+        self.stacked_buffer[height:] = cropped_image
+        return self.stacked_buffer
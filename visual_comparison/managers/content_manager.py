@@ -1,123 +1,532 @@
 import os
-import glob
-from typing import List
-from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+from typing import List, Optional, Tuple
 from itertools import repeat
 
 import cv2
+import numpy as np
 from tqdm import tqdm
 
 from ..utils import file_utils
 from ..utils import file_reader
-from ..utils import VideoCapture, get_video_information
+from ..utils import image_utils
+from ..utils import VideoCapture
+from .catalog import Catalog
+from .load_scheduler import LoadPriority, LoadScheduler
+from .metadata_manager import MetadataManager
+from .prefetch_manager import PrefetchManager
+from .proxy_manager import ProxyManager
+from .stream_decoder import DecoderGroup
 
 
 __all__ = ["ContentManager"]
 
 
 class ContentManager:
-    def __init__(self, root: str, preview_folder: str, require_color_conversion: bool):
+    # Heights thumbnails are generated and cached at. The first tier is used by the preview widget.
+    THUMBNAIL_TIERS = (75, 100, 125)
+
+    # Number of preview files loaded between checks for cancellation and catalog writes
+    LOADING_CHUNK_SIZE = 64
+
+    def __init__(
+        self,
+        root: str,
+        preview_folder: str,
+        require_color_conversion: bool,
+        cache_dir: Optional[str] = None,
+        progressive_loading: bool = False,
+        prefetch_window: Tuple[int, int] = (0, 0),
+        decode_ahead_frames: int = 0,
+        history_mb: int = 0,
+        proxy_dir: Optional[str] = None,
+        proxy_height: int = 1080,
+        keep_high_bit_depth: bool = False,
+    ):
         """
         :param require_color_conversion: If True, we need to extract metadata information (so we know whether to do correction or change color spaces)
+        :param cache_dir: [Optional] Directory to store the catalog in. Catalog is not used if None.
+        :param progressive_loading: If True, thumbnails and data rows which are not cached are loaded in the background.
+            Call poll_loaded periodically to receive them.
+        :param prefetch_window: Number of (next, previous) files whose images are decoded into the shared image cache in
+            the background after loading files. Prefetching is disabled if the shared image cache is.
+        :param decode_ahead_frames: Number of frames each video decodes ahead in the background, so that playback
+            does not wait for decoding. Videos are only decoded on read if 0.
+        :param history_mb: Total size in MB of recently displayed video frames kept in memory, so that stepping
+            backwards within them does not seek the videos.
+        :param proxy_dir: [Optional] Directory to store low resolution proxies of videos in. Proxies are not used if None.
+        :param proxy_height: Height of proxies. Videos which are not taller are displayed directly.
+        :param keep_high_bit_depth: If True, images with more than 8 bits are also kept at their original depth for
+            zoom crops, see read_detail_frames.
         """
         self.root = root
         self.preview_folder = preview_folder
         self.require_color_conversion = require_color_conversion
+        self.progressive_loading = progressive_loading
 
-        self.methods = file_utils.get_folders(root, preview_folder)
-        self.files = file_utils.get_filenames(root, self.methods)
+        # Persistent catalog, so that reopening an unchanged root is fast
+        self.catalog = Catalog(root, cache_dir) if cache_dir is not None else None
 
+        self.methods = []
+        self.files = []
+
+        # Previously loaded state, used as a first level cache when rescanning (before the catalog)
+        self.folder_listings = dict()  # method -> (mtime_ns, listing)
+        self.stem_indices = dict()  # method -> file -> path
+        self.ambiguous_files = dict()  # method -> file -> paths, for files sharing the same name but not extension
+        self.file_records = dict()  # method -> file -> record (path, size, mtime_ns, metadata)
+        self.preview_records = dict()  # path -> record (size, mtime_ns, color_conversion, thumbnail, data)
+        self.encoded_thumbnails = dict()  # path -> tier -> encoded thumbnail, only kept in memory if there is no catalog
+        self.keyframe_records = dict()  # path -> record (size, mtime_ns, keyframes), built on first seek
+        self.updated_records = dict()
+
+        # Files being displayed, set by poll_load. May lag behind the current selection while loading.
         self.content_loaders = None
         self.video_indices = []
+        self.decoder_group = None  # Seeks and reads content_loaders, one thread per video
+        self.decode_ahead_frames = decode_ahead_frames
+        self.history_mb = history_mb
+        self.loaded_proxied = False  # Whether proxies of the loaded paths are displayed
+        self.detail_group = None  # Reads the original videos when proxies are displayed, see read_detail_frames
+        self.detail_frames = None  # (position, frames) last read by detail_group
+        self.loaded_paths = []
+        self.loaded_metadata = []
+        self.loaded_methods = []
+        self.loaded_title = ""
+        self.load_generation = 0
+        self.pending_loads = []  # Requests from request_load which have not been displayed yet, oldest first
 
         self.current_index = 0
-        self.current_methods = list(self.methods)
-        self.current_files = list(self.files)
+        self.current_methods = []
+        self.current_files = []
 
         self.metadata = dict()
-        if require_color_conversion:
-            self._init_get_metadata()
-        self.current_metadata = dict(self.metadata)
+        self.current_metadata = dict()
+        self.metadata_manager = MetadataManager()
+
+        # Loads files to display, prefetches and thumbnails in that order of priority
+        self.scheduler = LoadScheduler(max_workers=4)
+
+        self.prefetch_window = prefetch_window
+        self.keep_high_bit_depth = keep_high_bit_depth
+        self.prefetch_manager = PrefetchManager(self.scheduler, keep_high_bit_depth)
+        self.proxy_manager = ProxyManager(proxy_dir, proxy_height) if proxy_dir is not None else None
 
         # Could use pandas but don't want to introduce dependency
         self.data = []
         self.thumbnails = []
+        self.tier_thumbnails = dict()  # tier -> thumbnails, decoded on request
         self.data_titles = ["S/N", "File Path", "Height", "Width", "Frame Count", "FPS"]
 
-        # For fast image reading
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # Background loading of thumbnails and data rows
+        self.preview_paths = []  # Path of the preview file for each file
+        self.loading_queue = queue.Queue()
+        self.loading_cancelled = threading.Event()
+        self.loading_done, self.loading_total = 0, 0
 
         # Collect and store file information. Time vs memory trade off. Reduce wait for many files.
-        self._init_get_data()
+        self.refresh()
+
 
+    def __enter__(self):
+        return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.executor.shutdown(wait=False)
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops background loading and releases the displayed files and all worker threads and processes.
+        Must be called from the main thread, the object cannot be used afterwards.
+        """
+        self.loading_cancelled.set()
+        self.prefetch_manager.cancel()
+        for request in self.pending_loads:
+            self._release_request(request)
+        self.pending_loads = []
+        if self.content_loaders is not None:
+            self.decoder_group.close()
+            for cap in self.content_loaders:
+                cap.release()
+            self.decoder_group, self.content_loaders = None, None
+        self._close_detail_group()
+        if self.proxy_manager is not None:
+            self.proxy_manager.shutdown()
+        self.scheduler.shutdown()
+        self.metadata_manager.shutdown()
+        if self.catalog is not None:
+            self.catalog.close()
+
+    def can_refresh(self, root: str, preview_folder: str, require_color_conversion: bool) -> bool:
+        """
+        :return: True if the requested content can be loaded by refreshing this object instead of creating a new one
+        """
+        same_root = os.path.abspath(root) == os.path.abspath(self.root)
+        return same_root and preview_folder == self.preview_folder and require_color_conversion == self.require_color_conversion
+
+    def scan(self) -> dict:
+        """
+        Rescans the root folder without changing the loaded content, so that the result can be checked before it is
+        applied with refresh.
+        :return: dict(methods, files, folder_listings, stem_indices, ambiguous_files)
+        """
+        methods = file_utils.get_folders(self.root, self.preview_folder)
+        folder_listings, stem_indices, ambiguous_files = self._scan_folders(methods)
+        files = file_utils.get_filenames(self.root, methods, stem_indices)
+        return dict(methods=methods, files=files, folder_listings=folder_listings, stem_indices=stem_indices, ambiguous_files=ambiguous_files)
+
+    def refresh(self, scan: Optional[dict] = None):
+        """
+        Rescans the root folder and patches files, metadata, data and thumbnails in place.
+        Only new or modified files are probed and decoded, removed files are dropped.
+        The current file is kept selected if it still exists, the other selections are reset.
+        With progressive loading, thumbnails and data of new or modified files are loaded in the background.
+        :param scan: [Optional] Result of scan to apply, the root folder is scanned if None
+        """
+        current_file = self.current_files[self.current_index] if len(self.current_files) > 0 else None
+
+        if scan is None:
+            scan = self.scan()
+        self.methods = scan["methods"]
+        self.files = scan["files"]
+        self.folder_listings = scan["folder_listings"]
+        self.stem_indices = scan["stem_indices"]
+        self.ambiguous_files = scan["ambiguous_files"]
+        self.prefetch_manager.cancel()
+
+        self.updated_records = dict()
+        self._scan_records()
+        if self.require_color_conversion:
+            self._scan_metadata()
+        if self.catalog is not None:
+            for method, records in self.updated_records.items():
+                self.catalog.put_files(method, records)
+        self._scan_data()
+
+        self.current_methods = list(self.methods)
+        self.current_files = list(self.files)
+        self.current_metadata = dict(self.metadata)
+        self.current_index = self.files.index(current_file) if current_file in self.files else 0
 
-    def _init_get_metadata(self):
+    def _scan_folders(self, methods: List[str]) -> Tuple[dict, dict, dict]:
         """
-        Called during initialization.
-        Retrieves metadata for all files to compare.
+        Lists and indexes every method folder, reusing the previous or catalog listing if the folder has not been
+        modified since. The loaded listings are not changed.
+        :param methods: Method folders to scan
+        :return: (folder_listings, stem_indices, ambiguous_files) of methods
         """
+        folder_listings, stem_indices, ambiguous_files = dict(), dict(), dict()
+        for method in methods:
+            folder_path = os.path.join(self.root, method)
+            mtime_ns = os.stat(folder_path).st_mtime_ns
+
+            previous_mtime_ns, listing = self.folder_listings.get(method, (None, None))
+            if previous_mtime_ns == mtime_ns:
+                folder_listings[method] = (mtime_ns, listing)
+                stem_indices[method] = self.stem_indices[method]
+                if method in self.ambiguous_files:
+                    ambiguous_files[method] = self.ambiguous_files[method]
+                continue
+
+            listing = self.catalog.get_listing(method, mtime_ns) if self.catalog is not None else None
+            if listing is None:
+                listing = file_utils.list_folder(folder_path)
+                if self.catalog is not None:
+                    self.catalog.put_listing(method, mtime_ns, listing)
+
+            stem_index, ambiguous = file_utils.build_stem_index(folder_path, listing)
+            stem_indices[method] = stem_index
+            if len(ambiguous) > 0:
+                ambiguous_files[method] = ambiguous
+            folder_listings[method] = (mtime_ns, listing)
+
+        # Folders which no longer exist are dropped
+        return folder_listings, stem_indices, ambiguous_files
+
+    def _scan_records(self):
+        """
+        Resolves paths of all files to compare. Previous and catalog records are reused if the file's size and mtime
+        are unchanged.
+        """
+        file_records = dict()
+        for method in self.methods:
+            known_records = self.catalog.get_files(method) if self.catalog is not None else {}
+            known_records.update(self.file_records.get(method, {}))
+
+            records, stale_files = dict(), []
+            for file in self.files:
+                record = known_records.get(file, None)
+                if record is not None and Catalog.is_valid(record, Catalog.stat(record["path"])):
+                    records[file] = record
+                else:
+                    stale_files.append(file)
+
+            stale_paths = file_utils.complete_paths(self.root, method, stale_files, self.stem_indices[method])
+            self.updated_records[method] = {}
+            for file, path in zip(stale_files, stale_paths):
+                size, mtime_ns = Catalog.stat(path)
+                records[file] = dict(path=path, size=size, mtime_ns=mtime_ns, metadata=None)
+                self.updated_records[method][file] = records[file]
+
+            file_records[method] = records
+
+        self.file_records = file_records
+
+    def _scan_metadata(self):
+        """
+        Retrieves metadata for all files to compare which do not have any yet, for all methods in one batch.
+        """
+        def key(record):
+            return record["path"], record["size"], record["mtime_ns"]
+
+        missing = [(method, file) for method in self.methods for file in self.files if self.file_records[method][file]["metadata"] is None]
+        missing_keys = [key(self.file_records[method][file]) for method, file in missing]
+        for (method, file), metadata in zip(missing, self.metadata_manager.get_metadata(missing_keys)):
+            record = self.file_records[method][file]
+            record["metadata"] = metadata
+            self.updated_records[method][file] = record
+
+        self.metadata = dict()
         for method in self.methods:
-            method_files = file_utils.complete_paths(self.root, method, self.files)
-            with ThreadPoolExecutor() as executor:
-                self.metadata[method] = list(tqdm(executor.map(get_video_information, method_files), total=len(method_files), desc=f"Loading metadata for {method}..."))
+            self.metadata[method] = [self.file_records[method][file]["metadata"] for file in self.files]
+        # Forget files which have been removed or modified
+        self.metadata_manager.retain(set(key(record) for records in self.file_records.values() for record in records.values()))
 
-    def _init_get_data(self):
+    def _scan_data(self):
         """
-        Called during initialization.
-        Retrieves info needed for preview like file information and in self.data_titles info.
+        Retrieves info needed for preview like file information and in self.data_titles info, and thumbnails.
+        Previous and catalog entries are reused when the preview file is unchanged, the others are loaded
+        (in the background with progressive loading). Until then, they have a placeholder thumbnail and no data row.
         """
+        # Results of a previous scan which is still loading are outdated
+        self.loading_cancelled.set()
+        self.loading_cancelled = threading.Event()
+        self.loading_queue = queue.Queue()
+        self.loading_done, self.loading_total = 0, 0
+
+        self.data = []
+        self.thumbnails = []
+        self.tier_thumbnails = dict()
         if not (len(self.methods) > 0 and len(self.files) > 0):
+            self.preview_paths = []
+            self.preview_records = dict()
+            self.encoded_thumbnails = dict()
             return
 
-        # Load images for preview window. Multi thread for faster reading.
-        file_paths = file_utils.complete_paths(self.root, self.preview_folder, self.files)
-        metadata = self.metadata[self.preview_folder] if self.require_color_conversion else [None] * len(file_paths)
+        records = [self.file_records[self.preview_folder][file] for file in self.files]
+        catalog_previews, catalog_thumbnails = None, None
+
+        results, stale_indices = [None] * len(records), []
+        for idx, record in enumerate(records):
+            stat = (record["size"], record["mtime_ns"])
+            preview = self.preview_records.get(record["path"], None)
+            if preview is None:
+                # Only read the catalog if we need to, e.g. first scan
+                if catalog_previews is None:
+                    catalog_previews = self.catalog.get_previews() if self.catalog is not None else {}
+                    catalog_thumbnails = self.catalog.get_thumbnails(self.THUMBNAIL_TIERS[0]) if self.catalog is not None else {}
+                preview = catalog_previews.get(record["path"], None)
+                thumbnail = catalog_thumbnails.get(record["path"], None)
+                if preview is not None and self._is_valid_preview(thumbnail, stat):
+                    preview["thumbnail"] = self._decode_thumbnail(thumbnail["thumbnail"])
+                else:
+                    preview = None
+
+            if preview is not None and self._is_valid_preview(preview, stat):
+                results[idx] = preview
+            else:
+                stale_indices.append(idx)
+
+        placeholder = np.zeros((self.THUMBNAIL_TIERS[0], self.THUMBNAIL_TIERS[0], 3), dtype=np.uint8)
+        self.preview_paths = [record["path"] for record in records]
+        self.preview_records = dict()
+        for idx, (record, preview) in enumerate(zip(records, results)):
+            if preview is None:
+                self.thumbnails.append(placeholder)
+                continue
+            self.preview_records[record["path"]] = preview
+            self.thumbnails.append(preview["thumbnail"])
+            self.data.append([idx] + preview["data"])
+        if self.catalog is None:
+            self.encoded_thumbnails = {path: self.encoded_thumbnails[path] for path in self.preview_paths if path in self.encoded_thumbnails}
+
+        # Load the rest. Multi thread for faster reading.
+        stale_records = [(idx, records[idx]) for idx in stale_indices]
+        metadata = [self.metadata[self.preview_folder][i] for i in stale_indices] if self.require_color_conversion else [None] * len(stale_indices)
+        self.loading_total = len(stale_records)
+        if self.progressive_loading:
+            loading_thread = threading.Thread(target=self._load_data, args=(stale_records, metadata, self.loading_queue, self.loading_cancelled), daemon=True)
+            loading_thread.start()
+        else:
+            self._load_data(stale_records, metadata, self.loading_queue, self.loading_cancelled)
+            self.poll_loaded()
+
+    def _load_data(self, stale_records: List[tuple], metadata: List[Optional[dict]], result_queue: queue.Queue, cancelled: threading.Event):
+        """
+        Loads thumbnails and data rows in chunks, putting (index, preview, encoded thumbnails) in result_queue and
+        storing them in the catalog. Files which cannot be read are put as (index, None, None) and loading continues,
+        they keep their placeholder and are retried on the next refresh. Other errors are put in the queue instead.
+        :param stale_records: List of (index, record) of the preview files to load
+        :param metadata: Metadata of each preview file
+        :param result_queue: Queue to put results in, read by poll_loaded
+        :param cancelled: Stops loading when set
+        """
+        pbar = tqdm(desc="Loading file info...", total=len(stale_records))
+        try:
+            for start in range(0, len(stale_records), self.LOADING_CHUNK_SIZE):
+                if cancelled.is_set():
+                    return
+
+                chunk = stale_records[start: start + self.LOADING_CHUNK_SIZE]
+                file_paths = [record["path"] for _, record in chunk]
+                chunk_metadata = metadata[start: start + self.LOADING_CHUNK_SIZE]
+                futures = [self.scheduler.submit(LoadPriority.BACKGROUND, self._init_load_file_info, *args) for args in zip(file_paths, chunk_metadata, repeat(self.THUMBNAIL_TIERS))]
+
+                updated_previews, updated_thumbnails = {}, {}
+                for (idx, record), future in zip(chunk, futures):
+                    try:
+                        thumbnails, data = future.result()
+                    except Exception as e:
+                        if future.cancelled():
+                            # Closed while loading
+                            return
+                        tqdm.write(f"Unable to load preview of {record['path']}: {e}")
+                        result_queue.put((idx, None, None))
+                        pbar.update(1)
+                        continue
+
+                    updated_previews[record["path"]] = dict(
+                        size=record["size"],
+                        mtime_ns=record["mtime_ns"],
+                        color_conversion=self.require_color_conversion,
+                        data=data,
+                    )
+                    encoded = {tier: cv2.imencode(".png", thumbnail)[1].tobytes() for tier, thumbnail in thumbnails.items()}
+                    updated_thumbnails[record["path"]] = dict(updated_previews[record["path"]], thumbnails=encoded)
+                    preview = dict(updated_previews[record["path"]], thumbnail=thumbnails[self.THUMBNAIL_TIERS[0]])
+                    result_queue.put((idx, preview, encoded))
+                    pbar.update(1)
+
+                if self.catalog is not None and not cancelled.is_set():
+                    self.catalog.put_previews(updated_previews)
+                    self.catalog.put_thumbnails(updated_thumbnails)
+        except Exception as e:
+            result_queue.put(e)
+        finally:
+            pbar.close()
+
+    def poll_loaded(self) -> List[int]:
+        """
+        Adds the thumbnails and data rows loaded since the last call. Must be called from the main thread.
+        :return: Indices (in self.files) of the newly loaded files
+        """
+        loaded_indices = []
+        while True:
+            try:
+                result = self.loading_queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(result, Exception):
+                raise result
+
+            idx, preview, encoded = result
+            loaded_indices.append(idx)
+            if preview is None:
+                # Unreadable, keeps its placeholder thumbnail and has no data row
+                continue
+
+            path = self.preview_paths[idx]
+            self.preview_records[path] = preview
+            self.thumbnails[idx] = preview["thumbnail"]
+            self.data.append([idx] + preview["data"])
+            if self.catalog is None:
+                self.encoded_thumbnails[path] = encoded
+
+        if len(loaded_indices) > 0:
+            self.loading_done += len(loaded_indices)
+            self.data.sort(key=lambda row: row[0])
+            self.tier_thumbnails = dict()
+        return loaded_indices
+
+    def is_loading(self) -> bool:
+        """
+        :return: True if there are thumbnails and data rows which have not been received by poll_loaded yet
+        """
+        return self.loading_done < self.loading_total
+
+    def _is_valid_preview(self, preview: Optional[dict], stat: tuple) -> bool:
+        """
+        :param preview: Preview or thumbnail record
+        :param stat: (size, mtime_ns) of the preview file
+        """
+        return Catalog.is_valid(preview, stat) and preview["color_conversion"] == self.require_color_conversion
 
-        return_values = tqdm(
-            iterable=self.executor.map(self._init_load_file_info, file_paths, metadata),
-            desc="Loading file info...",
-            total=len(file_paths)
-        )
+    @staticmethod
+    def _decode_thumbnail(thumbnail: bytes) -> np.array:
+        return cv2.imdecode(np.frombuffer(thumbnail, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
 
-        for idx, (thumbnail, data) in enumerate(return_values):
-            self.thumbnails.append(thumbnail)
-            self.data.append([idx] + data)
+    def get_thumbnails(self, row_height: int) -> List[np.array]:
+        """
+        Thumbnails of all files at the given height. Cached tiers are loaded without decoding the source files,
+        other heights are resized from the closest larger tier.
+        :param row_height: Height of the thumbnails
+        :return: List of thumbnails, in the same order as self.thumbnails
+        """
+        row_height = int(row_height)
+        if row_height == self.THUMBNAIL_TIERS[0]:
+            return self.thumbnails
+
+        tier = min([t for t in self.THUMBNAIL_TIERS if t >= row_height], default=self.THUMBNAIL_TIERS[-1])
+        if tier not in self.tier_thumbnails:
+            catalog_thumbnails = self.catalog.get_thumbnails(tier) if self.catalog is not None else {}
+
+            thumbnails = []
+            for path, base_thumbnail in zip(self.preview_paths, self.thumbnails):
+                preview = self.preview_records.get(path, None)
+                if preview is None:
+                    # Not loaded yet
+                    encoded = None
+                elif self.catalog is not None:
+                    record = catalog_thumbnails.get(path, None)
+                    encoded = record["thumbnail"] if self._is_valid_preview(record, (preview["size"], preview["mtime_ns"])) else None
+                else:
+                    encoded = self.encoded_thumbnails.get(path, {}).get(tier, None)
+
+                # Missing from the cache, e.g. not loaded yet. Upscale rather than decoding the source file.
+                if encoded is not None:
+                    thumbnails.append(self._decode_thumbnail(encoded))
+                else:
+                    thumbnails.append(image_utils.resize_to_height(base_thumbnail, tier))
+            self.tier_thumbnails[tier] = thumbnails
+
+        if tier == row_height:
+            return self.tier_thumbnails[tier]
+        return [image_utils.resize_to_height(thumbnail, row_height) for thumbnail in self.tier_thumbnails[tier]]
 
     @staticmethod
-    def _init_load_file_info(file_path, metadata, max_height=75):
-        cap = file_reader.read_media_file(file_path, metadata)
-        ret, img = cap.read()
+    def _init_load_file_info(file_path, metadata, tiers):
+        img, info = file_reader.read_thumbnail(file_path, metadata, max(tiers))
+        if img is None:
+            raise RuntimeError(f"Unable to read {file_path}")
 
         img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        h, w, _ = img.shape
-        scale = max_height / h
-        thumbnail = cv2.resize(img, (int(w * scale), int(h * scale)))
+        thumbnails = {tier: image_utils.resize_to_height(img, tier) for tier in tiers}
 
-        data = [os.path.splitext(os.path.basename(file_path))[0], h, w]
-        if isinstance(cap, VideoCapture):
-            data.append(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
-            data.append(round(cap.get(cv2.CAP_PROP_FPS), 2))
+        data = [os.path.splitext(os.path.basename(file_path))[0], info["height"], info["width"]]
+        if "frame_count" in info:
+            data.append(info["frame_count"])
+            data.append(info["fps"])
 
-        cap.release()
-        return thumbnail, data
+        return thumbnails, data
 
     def _get_current_paths(self) -> List[str]:
         """
         Get path to files for currently selected methods and files
         :return: List of paths
         """
-        output_paths = []
-        # TODO: Optimize. I think this is a O(n^2) method, if we use dict to map could reduce to O(n)
-        for method in self.current_methods:
-            incomplete_path = os.path.join(self.root, method, self.current_files[self.current_index])
-            completed_paths = glob.glob(incomplete_path + ".*")
-            assert len(completed_paths) == 1, completed_paths
-            output_paths.append(completed_paths[0])
-
-        return output_paths
+        current_file = self.current_files[self.current_index]
+        return [self.stem_indices[method][current_file] for method in self.current_methods]
 
     def _get_current_metadata(self) -> List[dict]:
         metadata = []
@@ -151,71 +560,238 @@ class ContentManager:
     def get_title(self):
         return f"[{self.current_index}/{len(self.current_files) - 1}] {self.current_files[self.current_index]}"
 
-    def load_single_file(self):
+    def request_load(self):
         """
-        :returns: VideoCapture or ImageCapture object
+        Requests loading the current files of all current methods in the background, ahead of prefetching and
+        thumbnails. Requests which have not started yet are cancelled. Call poll_load to display the result.
         """
+        for request in self.pending_loads:
+            if not any(future.running() or future.done() for future in request["futures"]):
+                for future in request["futures"]:
+                    future.cancel()
+
+        self.load_generation += 1
         current_paths = self._get_current_paths()
         current_metadata = self._get_current_metadata()
-        return file_reader.read_media_file(current_paths[0], current_metadata[0])
+        load_paths = self._get_proxy_paths(current_paths)
+        self.pending_loads.append(dict(
+            generation=self.load_generation,
+            futures=[self.scheduler.submit(LoadPriority.FOREGROUND, file_reader.read_media_file, path, metadata, self.keep_high_bit_depth) for path, metadata in zip(load_paths, current_metadata)],
+            proxied=load_paths != current_paths,
+            paths=current_paths,
+            metadata=current_metadata,
+            methods=list(self.current_methods),
+            title=self.get_title(),
+        ))
+
+        self._prefetch_neighbours()
+
+    def poll_load(self) -> bool:
+        """
+        Displays the newest completed request from request_load, dropping older ones. Must be called from the main thread.
+        :return: True if new files are displayed
+        """
+        for i in reversed(range(len(self.pending_loads))):
+            request = self.pending_loads[i]
+            if not all(future.done() for future in request["futures"]):
+                continue
+            if any(future.cancelled() for future in request["futures"]):
+                # Superseded before it started, nothing to display
+                continue
+
+            for outdated in self.pending_loads[:i]:
+                self._release_request(outdated)
+            self.pending_loads = self.pending_loads[i + 1:]
+
+            # Raises if any file could not be loaded
+            caps = [future.result() for future in request["futures"]]
+            if self.content_loaders is not None:
+                self.decoder_group.close()
+                for cap in self.content_loaders:
+                    cap.release()
+            self._close_detail_group()
+
+            self.content_loaders = caps
+            self.decoder_group = DecoderGroup(caps, self._get_keyframes, self.decode_ahead_frames, self.history_mb)
+            self.video_indices = [idx for idx, cap in enumerate(caps) if isinstance(cap, VideoCapture)]
+            self.loaded_paths = request["paths"]
+            self.loaded_metadata = request["metadata"]
+            self.loaded_methods = request["methods"]
+            self.loaded_title = request["title"]
+            self.loaded_proxied = request["proxied"]
+            return True
+
+        return False
+
+    def _get_proxy_paths(self, paths: List[str]) -> List[str]:
+        """
+        Proxies are only displayed if every file is a video with a proxy, so that all files have the same resolution.
+        Missing proxies are created in the background.
+        :param paths: Paths to files to display
+        :return: Paths to proxies, or paths if proxies cannot be displayed
+        """
+        if self.proxy_manager is None:
+            return paths
+        if any(os.path.splitext(path)[-1].lower() not in file_reader.VIDEO_EXTENSIONS for path in paths):
+            return paths
 
-    def load_files(self):
-        self.content_loaders = []
-        self.video_indices = []
+        proxy_paths = [self.proxy_manager.get_proxy(path) for path in paths]
+        if any(proxy_path is None for proxy_path in proxy_paths):
+            return paths
+        return proxy_paths
 
-        current_paths = self._get_current_paths()
-        current_metadata = self._get_current_metadata()
-        for file_idx, (file, metadata) in enumerate(zip(current_paths, current_metadata)):
-            cap = file_reader.read_media_file(file, metadata)
-            self.content_loaders.append(cap)
-            if isinstance(cap, VideoCapture):
-                self.video_indices.append(file_idx)
+    def read_detail_frames(self) -> Optional[List[np.array]]:
+        """
+        Higher quality versions of the displayed frames, e.g. for zooming in on details. These are the original videos
+        at the displayed frame if proxies are displayed, or the high bit depth sources of images if kept.
+        Sources are only used if every image has one of the same type, as the frames are merged into one buffer.
+        Originals are only opened on the first call for the loaded files.
+        :return: Frames in the same order as read_frames (not necessarily uint8, all of the same type), or None if there
+            is nothing better than the displayed frames
+        """
+        if not self.loaded_proxied:
+            if self.has_video() or any(cap.source is None for cap in self.content_loaders):
+                return None
+            if len(set(cap.source.dtype for cap in self.content_loaders)) > 1:
+                return None
+            return [cap.source for cap in self.content_loaders]
+
+        position = max(0, self.decoder_group.position - 1)
+        if self.detail_frames is not None and self.detail_frames[0] == position:
+            return self.detail_frames[1]
+
+        if self.detail_group is None:
+            caps = [file_reader.read_media_file(path, metadata) for path, metadata in zip(self.loaded_paths, self.loaded_metadata)]
+            self.detail_group = DecoderGroup(caps, self._get_keyframes)
+        self.detail_group.seek(position)
+        ret, frames = self.detail_group.read()
+        if not ret:
+            return None
+
+        self.detail_frames = (position, frames)
+        return frames
+
+    def _close_detail_group(self) -> None:
+        if self.detail_group is None:
+            return
+        self.detail_group.close()
+        for cap in self.detail_group.caps:
+            cap.release()
+        self.detail_group = None
+        self.detail_frames = None
+
+    @staticmethod
+    def _release_request(request: dict) -> None:
+        """
+        Cancels a request which will not be displayed, releasing whatever it loads without waiting for it
+        """
+        def release(future):
+            if future.exception() is None:
+                future.result().release()
+
+        for future in request["futures"]:
+            if not future.cancel():
+                future.add_done_callback(release)
+
+    def _prefetch_neighbours(self):
+        """
+        Decodes images of the next and previous files for all current methods in the background, nearest first.
+        Videos are not prefetched.
+        """
+        num_next, num_prev = self.prefetch_window
+        offsets = [offset for distance in range(1, max(num_next, num_prev) + 1) for offset in (distance, -distance)]
+        offsets = [offset for offset in offsets if -num_prev <= offset <= num_next]
+
+        requests = []
+        for offset in offsets:
+            index = self.current_index + offset
+            if not (0 <= index < len(self.current_files)):
+                continue
+
+            file = self.current_files[index]
+            for method in self.current_methods:
+                path = self.stem_indices[method][file]
+                if os.path.splitext(path)[-1].lower() not in file_reader.IMAGE_EXTENSIONS:
+                    continue
+                metadata = self.current_metadata[method][index] if self.require_color_conversion else None
+                requests.append((path, metadata))
+        self.prefetch_manager.prefetch(requests)
 
     def has_video(self):
         return len(self.video_indices) != 0
 
     def set_video_position(self, frame_no):
         """
-        # https://github.com/opencv/opencv/issues/9053
-        cap.grab() mentioned to be the solution for now.
-
-        Will be slow when want to adjust frames to position before current idx.
-        E.g. current = frame 50, desired = frame 10
+        Seeks all videos to frame_no concurrently. Recently displayed and decoded ahead frames are reused, otherwise
+        videos are seeked from the nearest preceding keyframe where possible (see VideoCapture.seek).
+        Keyframe indices are built on the first seek of each video.
+        Returns once every video is positioned on frame_no.
         """
-        content_paths = self._get_current_paths()
-        content_metadata = self._get_current_metadata()
-
-        def seek_video(vid_idx, no_frames, in_future):
-            if not in_future:
-                self.content_loaders[vid_idx] = file_reader.read_media_file(content_paths[vid_idx], content_metadata[vid_idx])
-            for i in range(no_frames):
-                self.content_loaders[vid_idx].grab()
-
         if not self.has_video():
             return
 
-        first_cap = self.content_loaders[self.video_indices[0]]
-        current_position = int(first_cap.get(cv2.CAP_PROP_POS_FRAMES))
-
-        is_in_future = current_position <= frame_no
-        number_frames = frame_no - current_position if is_in_future else frame_no
+        self.decoder_group.seek(frame_no)
 
-        # TODO: Might not be best solution, need to check if we can use threads to speed up this IO task
-        for video_idx in self.video_indices:
-            seek_video(video_idx, number_frames, is_in_future)
+    def _get_keyframes(self, path: str) -> List[int]:
+        """
+        Keyframe index of a video from memory, the catalog, or built from the container/ffprobe and verified against
+        sequential decoding.
+        :param path: Path to video
+        :return: Sorted keyframe indices, empty if the video can only be seeked sequentially
+        """
+        stat = Catalog.stat(path)
+        record = self.keyframe_records.get(path, None)
+        if not Catalog.is_valid(record, stat) and self.catalog is not None:
+            record = self.catalog.get_keyframes(path)
+
+        if not Catalog.is_valid(record, stat):
+            keyframes = self.metadata_manager.get_keyframes((path, *stat)) if stat is not None else None
+            keyframes = sorted(keyframes) if keyframes is not None else []
+            # The first, a middle and the last keyframe, reordering may only make later ones wrong
+            later_keyframes = [keyframe for keyframe in keyframes if keyframe > 0]
+            checked_keyframes = sorted({later_keyframes[0], later_keyframes[len(later_keyframes) // 2], later_keyframes[-1]}) if len(later_keyframes) > 0 else []
+            if len(checked_keyframes) > 0 and not file_reader.verify_keyframe_seek(path, checked_keyframes):
+                keyframes = []
+
+            record = dict(size=stat[0], mtime_ns=stat[1], keyframes=keyframes) if stat is not None else dict(size=None, mtime_ns=None, keyframes=[])
+            if self.catalog is not None and stat is not None:
+                self.catalog.put_keyframes(path, record)
+
+        self.keyframe_records[path] = record
+        return record["keyframes"]
 
     def get_video_position(self):
         if not self.has_video():
             raise RuntimeError("Should not be calling this when there are no videos")
 
-        cap = self.content_loaders[self.video_indices[0]]
-        video_position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
-        video_length = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        video_fps = cap.get(cv2.CAP_PROP_FPS)
-        return video_position, video_length, video_fps
-
-    def read_frames(self):
-        outputs = list(self.executor.map(lambda cap: cap.read(), self.content_loaders))
-        rets = [out[0] for out in outputs]
-        frames = [out[1] for out in outputs]
-        return all(rets), frames
+        # Captures may have decoded ahead of the displayed frame
+        return self.decoder_group.get_video_info()
+
+    def read_frames(self, drop: int = 0):
+        """
+        :param drop: Number of frames to skip if playback is falling behind, limited to frames already decoded ahead
+        :return: Whether every file returned a frame, and the frames of all current methods
+        """
+        return self.decoder_group.read(drop)
+
+    def set_decode_ahead(self, decode_ahead_frames: int) -> None:
+        """
+        :param decode_ahead_frames: Number of frames each video decodes ahead during playback
+        """
+        self.decode_ahead_frames = decode_ahead_frames
+        if self.decoder_group is not None:
+            self.decoder_group.set_buffer_size(decode_ahead_frames)
+
+    def set_history(self, history_mb: int) -> None:
+        """
+        :param history_mb: Total size in MB of recently displayed video frames kept in memory
+        """
+        self.history_mb = history_mb
+        if self.decoder_group is not None:
+            self.decoder_group.set_history_budget(history_mb)
+
+    def get_playback_stats(self) -> dict:
+        """
+        :return: See DecoderGroup.stats
+        """
+        return self.decoder_group.stats()
@@ -0,0 +1,78 @@
+import enum
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+
+__all__ = ["LoadPriority", "LoadScheduler"]
+
+
+class LoadPriority(enum.IntEnum):
+    """
+    Lower values are run first
+    """
+    FOREGROUND = 0  # Files which are about to be displayed
+    PREFETCH = 1  # Neighbouring files
+    BACKGROUND = 2  # Thumbnails and data rows
+
+
+class LoadScheduler:
+    """
+    Thread pool which runs queued jobs by priority, then in submission order. Foreground loads start before any
+    queued prefetch or thumbnail job, while jobs which are already running are left to finish.
+    Jobs which have not started yet can be cancelled through their future.
+    """
+    def __init__(self, max_workers: int = 4):
+        self.jobs = queue.PriorityQueue()
+        self.counter = itertools.count()  # Keeps the order of jobs with the same priority
+        self.shutdown_event = threading.Event()
+
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(max_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, priority: LoadPriority, fn: Callable, *args) -> Future:
+        """
+        :return: Future of the result of fn(*args)
+        """
+        future = Future()
+        if self.shutdown_event.is_set():
+            future.cancel()
+            return future
+        self.jobs.put((priority, next(self.counter), future, fn, args))
+        return future
+
+    def _work(self) -> None:
+        while True:
+            _, _, future, fn, args = self.jobs.get()
+            if self.shutdown_event.is_set():
+                if future is not None:
+                    future.cancel()
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self) -> None:
+        """
+        Stops the workers once their current job is done. Queued jobs are not run and their futures are cancelled.
+        """
+        self.shutdown_event.set()
+        while True:
+            try:
+                _, _, future, _, _ = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            if future is not None:
+                future.cancel()
+        for _ in self.workers:
+            # Wake up idle workers
+            self.jobs.put((-1, next(self.counter), None, None, None))
@@ -0,0 +1,92 @@
+import os
+from typing import List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+from ..utils import IMAGE_EXTENSIONS, get_video_information, get_video_keyframes, read_container_keyframes, read_container_metadata
+
+
+__all__ = ["MetadataManager"]
+
+
+class MetadataManager:
+    """
+    Extracts metadata (ffprobe stream information) for files to compare.
+
+    Still images are not probed. Container headers of MP4/MOV files are read in-process, and ffprobe is only spawned
+    (without a shell) on a bounded pool of workers for files whose header does not have the information.
+    Results are cached by (path, size, mtime_ns). Keyframe indices of videos are extracted the same way, on request.
+    """
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        :param max_workers: [Optional] Maximum number of concurrent ffprobe processes. Defaults to the number of CPUs, at most 8.
+        """
+        self.max_workers = max_workers if max_workers is not None else min(8, os.cpu_count() or 1)
+        self.cache = dict()  # (path, size, mtime_ns) -> metadata
+        self.keyframes_cache = dict()  # (path, size, mtime_ns) -> keyframe indices
+
+        # Only created once ffprobe is needed, e.g. never for image only roots
+        self.executor = None
+
+    @staticmethod
+    def _read_header(file_path: str) -> Optional[dict]:
+        """
+        :return: Metadata that can be obtained without ffprobe, or None if ffprobe is required
+        """
+        if os.path.splitext(file_path)[-1].lower() in IMAGE_EXTENSIONS:
+            return {}
+        return read_container_metadata(file_path)
+
+    def get_metadata(self, files: List[Tuple[str, int, int]], desc: str = "Loading metadata...") -> List[dict]:
+        """
+        :param files: List of (path, size, mtime_ns)
+        :param desc: Description for the progress bar
+        :return: Metadata of each file, in the same order as files. Empty dictionary if unavailable.
+        """
+        results, probe_keys = [None] * len(files), []
+        for idx, key in enumerate(files):
+            metadata = self.cache.get(key, None)
+            if metadata is None:
+                metadata = self._read_header(key[0])
+            if metadata is None:
+                probe_keys.append((idx, key))
+            else:
+                self.cache[key] = metadata
+                results[idx] = metadata
+
+        if len(probe_keys) > 0:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+            probed = self.executor.map(get_video_information, [key[0] for _, key in probe_keys])
+            for (idx, key), metadata in tqdm(zip(probe_keys, probed), total=len(probe_keys), desc=desc):
+                self.cache[key] = metadata
+                results[idx] = metadata
+
+        return results
+
+    def get_keyframes(self, file: Tuple[str, int, int]) -> Optional[List[int]]:
+        """
+        :param file: (path, size, mtime_ns) of a video
+        :return: Sorted 0-based indices of the keyframes, or None if unavailable
+        """
+        if file not in self.keyframes_cache:
+            keyframes = read_container_keyframes(file[0])
+            if keyframes is None:
+                keyframes = get_video_keyframes(file[0])
+            self.keyframes_cache[file] = keyframes
+        return self.keyframes_cache[file]
+
+    def retain(self, keys: Set[Tuple[str, int, int]]) -> None:
+        """
+        Drops cached entries which are no longer needed, e.g. files removed or modified since.
+        :param keys: Keys to keep
+        """
+        self.cache = {key: value for key, value in self.cache.items() if key in keys}
+        self.keyframes_cache = {key: value for key, value in self.keyframes_cache.items() if key in keys}
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
@@ -0,0 +1,56 @@
+import threading
+from typing import List, Optional, Tuple
+
+from ..utils import file_reader, shared_image_cache
+from .load_scheduler import LoadPriority, LoadScheduler
+
+
+__all__ = ["PrefetchManager"]
+
+
+class PrefetchManager:
+    """
+    Decodes images of neighbouring files in the background into the shared image cache, so that stepping through
+    files shows already decoded images. Does nothing if the shared image cache is disabled.
+    """
+    def __init__(self, scheduler: LoadScheduler, keep_source: bool = False):
+        """
+        :param scheduler: Runs the decoding, after any foreground load
+        :param keep_source: Whether high bit depth sources are cached too, same as for foreground loads
+        """
+        self.keep_source = keep_source
+        self.lock = threading.Lock()
+
+        # Requests from a previous prefetch call are skipped if not started yet
+        self.generation = 0
+        self.scheduler = scheduler
+
+    def prefetch(self, requests: List[Tuple[str, Optional[dict]]]) -> None:
+        """
+        Decodes the images in the background, in order. Pending requests of the previous call are dropped.
+        :param requests: List of (image path, metadata)
+        """
+        if not shared_image_cache.enabled:
+            return
+
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        for path, metadata in requests:
+            self.scheduler.submit(LoadPriority.PREFETCH, self._load, generation, path, metadata)
+
+    def _load(self, generation: int, path: str, metadata: Optional[dict]) -> None:
+        with self.lock:
+            if generation != self.generation:
+                return
+        # Already cached, do not count it as a hit
+        if shared_image_cache.key(path, metadata is not None) in shared_image_cache:
+            return
+        file_reader.read_media_file(path, metadata, self.keep_source)
+
+    def cancel(self) -> None:
+        """
+        Drops all pending requests
+        """
+        with self.lock:
+            self.generation += 1
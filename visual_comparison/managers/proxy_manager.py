@@ -0,0 +1,120 @@
+import os
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Optional
+
+import cv2
+
+from .catalog import Catalog
+
+
+__all__ = ["ProxyManager"]
+
+
+def _create_proxy(video_path: str, proxy_path: str, max_height: int) -> bool:
+    """
+    Transcodes a video to an all-intra (MJPG) video of at most max_height, keeping every frame. Runs in a worker process.
+    Frames are written without color correction, proxies are read with the metadata of the original.
+    :return: True if the proxy was written, False if the video is not larger than max_height or cannot be read
+    """
+    cap = cv2.VideoCapture(video_path)
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not cap.isOpened() or height <= max_height:
+        cap.release()
+        return False
+
+    # MJPG requires even dimensions
+    proxy_height = max_height - max_height % 2
+    proxy_width = max(2, int(round(width * proxy_height / height / 2)) * 2)
+
+    # Written under a temporary name, so that a partial proxy is never used
+    temp_path = proxy_path + ".part.avi"
+    writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (proxy_width, proxy_height))
+    writer.set(cv2.VIDEOWRITER_PROP_QUALITY, 90)
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        writer.write(cv2.resize(frame, (proxy_width, proxy_height), interpolation=cv2.INTER_AREA))
+    writer.release()
+    cap.release()
+
+    os.replace(temp_path, proxy_path)
+    return True
+
+
+class ProxyManager:
+    """
+    Creates low resolution, all-intra copies (proxies) of videos in a cache directory, so that scrubbing and playback
+    decode small frames which can be seeked to directly. Proxies are transcoded in background processes and are
+    named after the path, size and mtime of the original, so modified videos get a new proxy.
+    """
+    def __init__(self, proxy_dir: str, max_height: int, max_workers: int = 2):
+        """
+        :param proxy_dir: Directory to store proxies in
+        :param max_height: Height of proxies. Videos which are not taller are used directly.
+        :param max_workers: Maximum number of concurrent transcoding processes
+        """
+        self.proxy_dir = proxy_dir
+        self.max_height = max_height
+        self.max_workers = max_workers
+        os.makedirs(proxy_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.pending: Dict[str, Future] = dict()  # proxy path -> transcoding job
+        self.not_required = set()  # Proxy paths of videos which do not need or failed to get a proxy
+
+        # Only created once a proxy is needed. Spawned, as forking a process with running decoder threads is unsafe.
+        self.executor = None
+
+    def _get_proxy_path(self, video_path: str) -> Optional[str]:
+        stat = Catalog.stat(video_path)
+        if stat is None:
+            return None
+        key = f"{os.path.abspath(video_path)}:{stat[0]}:{stat[1]}:{self.max_height}"
+        return os.path.join(self.proxy_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".avi")
+
+    def get_proxy(self, video_path: str) -> Optional[str]:
+        """
+        Returns the proxy of a video if it exists, otherwise starts creating it in the background.
+        :param video_path: Path to original video
+        :return: Path to proxy, or None if it is not available (yet)
+        """
+        proxy_path = self._get_proxy_path(video_path)
+        if proxy_path is None:
+            return None
+        if os.path.isfile(proxy_path):
+            return proxy_path
+
+        with self.lock:
+            if proxy_path in self.pending or proxy_path in self.not_required:
+                return None
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            future = self.executor.submit(_create_proxy, video_path, proxy_path, self.max_height)
+            self.pending[proxy_path] = future
+        future.add_done_callback(lambda done_future: self._on_done(proxy_path, done_future))
+        return None
+
+    def _on_done(self, proxy_path: str, future: Future) -> None:
+        with self.lock:
+            self.pending.pop(proxy_path, None)
+            # Failed transcodes are not retried in this session
+            if not future.cancelled() and (future.exception() is not None or not future.result()):
+                self.not_required.add(proxy_path)
+
+    def shutdown(self) -> None:
+        """
+        Cancels proxies which have not started. Running transcodes finish in the background.
+        """
+        with self.lock:
+            executor, self.executor = self.executor, None
+            futures = list(self.pending.values())
+        # Outside the lock, cancelling runs _on_done
+        for future in futures:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,325 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, wait
+from typing import Callable, List, Tuple
+
+import cv2
+import numpy as np
+
+from ..utils import VideoCapture
+
+
+__all__ = ["StreamDecoder", "DecoderGroup"]
+
+
+class StreamDecoder:
+    """
+    Thread which owns a single video capture and runs commands on it in submission order, so that different videos
+    can be seeked and decoded concurrently while each capture is only used by one thread at a time.
+
+    When idle, the thread decodes ahead into a bounded buffer of upcoming (already color corrected) frames, so that
+    reads during playback only dequeue a frame. Recently read frames are kept in a memory bounded history, so that
+    stepping backwards within it does not need to seek the capture.
+    """
+    def __init__(self, cap: VideoCapture, get_keyframes: Callable[[str], List[int]], buffer_size: int = 0, history_budget: int = 0):
+        """
+        :param cap: Video to decode
+        :param get_keyframes: Returns the keyframe index of a video path, called on the first seek
+        :param buffer_size: Maximum number of frames decoded ahead. Frames are only decoded on read if 0.
+        :param history_budget: Maximum total size in bytes of the recently read frames which are kept
+        """
+        self.cap = cap
+        self.get_keyframes = get_keyframes
+
+        # Read before the thread starts, so that they never need to be read from another thread
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+
+        self.condition = threading.Condition()
+        self.commands = deque()
+        self.buffer = deque()  # (ret, frame) of the frames following the last read
+        self.buffer_size = buffer_size
+        self.end_of_stream = False
+        self.closed = False
+        self.late_frames = 0  # Reads which had to wait for a frame to be decoded
+        self.dropped_frames = 0  # Decoded frames skipped by read
+
+        # Frame number of the next read. Read frames (read only) up to it are kept in history, oldest first.
+        self.position = 0
+        self.history = deque()
+        self.history_size = 0
+        self.history_budget = history_budget
+
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """
+        :return: Future of the result of fn(*args), run on the decoder thread
+        """
+        future = Future()
+        with self.condition:
+            self.commands.append((future, fn, args))
+            self.condition.notify_all()
+        return future
+
+    def _should_decode_ahead(self) -> bool:
+        """
+        Requires self.condition
+        """
+        return not self.end_of_stream and len(self.buffer) < self.buffer_size
+
+    def _work(self) -> None:
+        while True:
+            with self.condition:
+                while not self.closed and len(self.commands) == 0 and not self._should_decode_ahead():
+                    self.condition.wait()
+                if len(self.commands) > 0:
+                    command = self.commands.popleft()
+                elif self.closed:
+                    return
+                else:
+                    command = None
+
+            if command is None:
+                ret, frame = self.cap.read()
+                with self.condition:
+                    self.buffer.append((ret, frame))
+                    self.end_of_stream = not ret
+                    self.condition.notify_all()
+                continue
+
+            future, fn, args = command
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def _retain(self, ret: bool, frame: np.array) -> None:
+        """
+        Advances the position past a read frame and keeps it in history. Requires self.condition
+        """
+        if not ret:
+            return
+        self.position += 1
+        if frame.nbytes > self.history_budget:
+            self.history.clear()
+            self.history_size = 0
+            return
+
+        frame.flags.writeable = False
+        self.history.append(frame)
+        self.history_size += frame.nbytes
+        while self.history_size > self.history_budget:
+            self.history_size -= self.history.popleft().nbytes
+
+    def _read(self) -> Tuple[bool, np.array]:
+        ret, frame = self.cap.read()
+        with self.condition:
+            self._retain(ret, frame)
+        return ret, frame
+
+    def _seek(self, frame_no: int) -> None:
+        with self.condition:
+            buffered = self._buffered_frames()
+
+            # Stepping back within history, put the frames back in front of the decoded ones
+            if self.position - len(self.history) <= frame_no < self.position:
+                for _ in range(self.position - frame_no):
+                    frame = self.history.pop()
+                    self.history_size -= frame.nbytes
+                    self.buffer.appendleft((True, frame))
+                self.position = frame_no
+                return
+
+            # Skipping forward within the decoded frames
+            if self.position <= frame_no < self.position + buffered:
+                for _ in range(frame_no - self.position):
+                    self._retain(*self.buffer.popleft())
+                self.condition.notify_all()
+                return
+
+            self.buffer.clear()
+            self.history.clear()
+            self.history_size = 0
+            self.end_of_stream = False
+
+        if self.cap.keyframes is None:
+            self.cap.set_keyframes(self.get_keyframes(self.cap.video_path))
+        self.cap.seek(frame_no)
+        with self.condition:
+            self.position = frame_no
+
+    def seek(self, frame_no: int) -> Future:
+        """
+        Positions the stream so that the next read returns frame frame_no. Served from history or decoded frames if
+        possible, otherwise decoded frames are discarded and the capture is seeked.
+        """
+        return self.submit(self._seek, frame_no)
+
+    def _buffered_frames(self) -> int:
+        """
+        Requires self.condition
+        """
+        return sum(1 for ret, _ in self.buffer if ret)
+
+    def buffered_frames(self) -> int:
+        """
+        :return: Number of successfully decoded frames waiting to be read
+        """
+        with self.condition:
+            return self._buffered_frames()
+
+    def read(self, drop: int = 0) -> Future:
+        """
+        :param drop: Number of frames to skip before the returned one. Must not exceed buffered_frames() - 1.
+        :return: Future of (ret, frame), already completed if the frame was decoded ahead
+        """
+        with self.condition:
+            if len(self.buffer) == 0 and self._should_decode_ahead():
+                self.late_frames += 1
+                self.condition.wait_for(lambda: len(self.buffer) > 0 or not self._should_decode_ahead())
+
+            # Not decoding ahead, or past the end of the video
+            if len(self.buffer) == 0:
+                return self.submit(self._read)
+
+            for _ in range(drop):
+                self._retain(*self.buffer.popleft())
+            self.dropped_frames += drop
+            ret, frame = self.buffer.popleft()
+            self._retain(ret, frame)
+            self.condition.notify_all()
+
+        future = Future()
+        future.set_result((ret, frame))
+        return future
+
+    def set_buffer_size(self, buffer_size: int) -> None:
+        """
+        :param buffer_size: Maximum number of frames decoded ahead. Frames already decoded are still read first.
+        """
+        with self.condition:
+            self.buffer_size = buffer_size
+            self.condition.notify_all()
+
+    def set_history_budget(self, history_budget: int) -> None:
+        """
+        :param history_budget: Maximum total size in bytes of the recently read frames which are kept
+        """
+        with self.condition:
+            self.history_budget = history_budget
+            while self.history_size > self.history_budget:
+                self.history_size -= self.history.popleft().nbytes
+
+    def close(self) -> None:
+        """
+        Stops the thread once submitted commands are done. The capture is not released.
+        """
+        with self.condition:
+            self.closed = True
+            self.buffer.clear()
+            self.history.clear()
+            self.condition.notify_all()
+        self.thread.join()
+
+
+class DecoderGroup:
+    """
+    Seeks and reads a set of captures together, with one StreamDecoder per video. Every call waits until all
+    streams are done, so all videos are always positioned on the same frame when it returns.
+    Images are cheap to read and are read on the calling thread.
+    """
+    def __init__(self, caps: List, get_keyframes: Callable[[str], List[int]], buffer_size: int = 0, history_mb: int = 0):
+        """
+        :param caps: ImageCapture/VideoCapture of every method, in display order
+        :param get_keyframes: Returns the keyframe index of a video path, called on the first seek of each video
+        :param buffer_size: Number of frames each video decodes ahead
+        :param history_mb: Total size in MB of recently read frames kept for stepping backwards, split between videos
+        """
+        self.caps = caps
+        num_videos = sum(1 for cap in caps if isinstance(cap, VideoCapture))
+        history_budget = self._get_history_budget(history_mb, num_videos)
+        self.decoders = {idx: StreamDecoder(cap, get_keyframes, buffer_size, history_budget) for idx, cap in enumerate(caps) if isinstance(cap, VideoCapture)}
+        self.position = 0  # Frame number of the next read
+
+    def seek(self, frame_no: int) -> None:
+        """
+        Positions every video so that the next read returns frame frame_no
+        """
+        futures = [decoder.seek(frame_no) for decoder in self.decoders.values()]
+        wait(futures)
+        # Raises the first error, after every stream has stopped
+        for future in futures:
+            future.result()
+        self.position = frame_no
+
+    def read(self, drop: int = 0) -> Tuple[bool, List[np.array]]:
+        """
+        :param drop: Number of frames to skip if playback is falling behind. Only frames which every video has already
+            decoded are skipped, so this never waits for decoding.
+        :return: Whether every capture returned a frame, and the frames in display order
+        """
+        if len(self.decoders) > 0:
+            drop = max(0, min(drop, min(decoder.buffered_frames() for decoder in self.decoders.values()) - 1))
+        else:
+            drop = 0
+
+        futures = {idx: decoder.read(drop) for idx, decoder in self.decoders.items()}
+        wait(futures.values())
+        outputs = [futures[idx].result() if idx in futures else cap.read() for idx, cap in enumerate(self.caps)]
+        rets = [out[0] for out in outputs]
+        frames = [out[1] for out in outputs]
+
+        if all(rets):
+            self.position += drop + 1
+        return all(rets), frames
+
+    def get_video_info(self) -> Tuple[int, int, float]:
+        """
+        :return: (position, frame count, fps), of the first video for frame count and fps
+        """
+        first_decoder = next(iter(self.decoders.values()))
+        return self.position, first_decoder.frame_count, first_decoder.fps
+
+    def set_buffer_size(self, buffer_size: int) -> None:
+        for decoder in self.decoders.values():
+            decoder.set_buffer_size(buffer_size)
+
+    @staticmethod
+    def _get_history_budget(history_mb: int, num_videos: int) -> int:
+        """
+        :return: History budget of each video in bytes
+        """
+        return history_mb * 1024 * 1024 // max(1, num_videos)
+
+    def set_history_budget(self, history_mb: int) -> None:
+        history_budget = self._get_history_budget(history_mb, len(self.decoders))
+        for decoder in self.decoders.values():
+            decoder.set_history_budget(history_budget)
+
+    def stats(self) -> dict:
+        """
+        :return: dict(buffered, buffer_size, late_frames, dropped_frames). Buffered is the least number of frames
+            decoded ahead by any video, counts are summed over all videos.
+        """
+        decoders = list(self.decoders.values())
+        if len(decoders) == 0:
+            return dict(buffered=0, buffer_size=0, late_frames=0, dropped_frames=0)
+        return dict(
+            buffered=min(decoder.buffered_frames() for decoder in decoders),
+            buffer_size=decoders[0].buffer_size,
+            late_frames=sum(decoder.late_frames for decoder in decoders),
+            dropped_frames=sum(decoder.dropped_frames for decoder in decoders),
+        )
+
+    def close(self) -> None:
+        """
+        Stops all decoder threads. The captures are not released.
+        """
+        for decoder in self.decoders.values():
+            decoder.close()
@@ -5,6 +5,7 @@ import tkinter
 import cv2
 import numpy as np
 
+from ..utils import image_conversions
 from ..utils import image_utils
 
 
@@ -26,6 +27,8 @@ class ZoomManager:
         self.zoom_bbox_pts = []
         self.zoom_box_frozen = False
         self.error_message = ""
+        # (rows, columns) of the displayed images, e.g. Concat mode. The region is selected in the image under its centre.
+        self.grid_shape = (1, 1)
 
     def on_mouse_move(self, event: tkinter.Event) -> None:
         """
@@ -75,6 +78,13 @@ class ZoomManager:
         h, w, c = image_size
         pt1_x, pt1_y = self.zoom_bbox_pts[0]
         pt2_x, pt2_y = self.zoom_bbox_pts[1]
+
+        # Coordinates within the image under the centre of the bbox
+        rows, cols = self.grid_shape
+        col = min(max((pt1_x + pt2_x) // 2 // max(w, 1), 0), cols - 1)
+        row = min(max((pt1_y + pt2_y) // 2 // max(h, 1), 0), rows - 1)
+        pt1_x, pt2_x = pt1_x - col * w, pt2_x - col * w
+        pt1_y, pt2_y = pt1_y - row * h, pt2_y - row * h
         start_x, start_y = min(pt1_x, pt2_x), min(pt1_y, pt2_y)
         start_x, start_y = max(0, start_x), max(0, start_y)  # Handle < 0 case
         width, height = abs(pt1_x - pt2_x), abs(pt1_y - pt2_y)
@@ -87,29 +97,33 @@ class ZoomManager:
 
         return start_x, start_y, width, height
 
-    def draw_regions(self, image: np.array, num_images: int = 1, color: Tuple[int, int, int] = (123, 80, 36)) -> np.array:
+    def draw_regions(self, image: np.array, num_images: int = 1, color: Tuple[int, int, int] = (123, 80, 36), scale: float = 1.0) -> np.array:
         """
         Draw bboxes and write error messages if any
         :param image: Image to draw on
-        :param num_images: Number of images to consider (>1 for concat mode)
+        :param num_images: Number of images to consider (>1 for concat mode), laid out in grid_shape
         :param color: Bbox color
+        :param scale: Size of image relative to the images the region is selected in, e.g. when composed at display size
         :return: Annotated image
         """
-        # For restricting movement of bbox and crop. Cropping for concat should be done on first image.
-        image_shape = image.shape if num_images == 1 else [image.shape[0], image.shape[1] // num_images, image.shape[2]]
+        # For restricting movement of bbox and crop
+        rows, cols = self.grid_shape
+        image_shape = [image.shape[0] // rows, image.shape[1] // cols, image.shape[2]]
+        source_shape = [int(round(image_shape[0] / scale)), int(round(image_shape[1] / scale)), image_shape[2]]
 
         # Marker so they can estimate box size
         if len(self.zoom_bbox_pts) == 1:
-            cv2.circle(image, self.zoom_bbox_pts[0], 3, color, -1)
+            pt_x, pt_y = self.zoom_bbox_pts[0]
+            cv2.circle(image, (int(pt_x * scale), int(pt_y * scale)), 3, color, -1)
 
         # Draw rect
         if len(self.zoom_bbox_pts) == 2:
             # Draw on first image
-            x, y, w, h = self._get_crop_region(image_shape)
+            x, y, w, h = [int(round(value * scale)) for value in self._get_crop_region(source_shape)]
 
             for i in range(num_images):
                 color = color if i == 0 else (128, 255, 128)
-                offset_x, offset_y = i * image_shape[1], 0
+                offset_x, offset_y = (i % cols) * image_shape[1], (i // cols) * image_shape[0]
                 pt1, pt2 = (x + i + offset_x, y + offset_y), (x + offset_x + w, y + offset_y + h)
                 cv2.rectangle(image, pt1, pt2, color, 2)
                 if self.zoom_box_frozen:
@@ -121,11 +135,43 @@ class ZoomManager:
 
         return image
 
-    def crop_regions(self, images: List[np.array], interpolation: int) -> np.array:
+    def get_crop_bounds(self, image_shape: np.shape, scale: float = 1.0) -> Optional[Tuple[int, int, int, int]]:
+        """
+        :param image_shape: Shape of the images the region is selected in
+        :param scale: Size of the images to crop from relative to image_shape, see crop_regions
+        :return: (x0, y0, x1, y1) of the region crop_regions takes from the images to crop from, None if not zooming
+        """
+        if len(self.zoom_bbox_pts) != 2:
+            return None
+        start_x, start_y, width, height = [int(round(value * scale)) for value in self._get_crop_region(image_shape)]
+        return start_x, start_y, start_x + width, start_y + height
+
+    def get_crop_height(self, image_shape: np.shape, output_width: int, num_images: int = 1) -> int:
+        """
+        :param image_shape: Shape of each image the region is selected in
+        :param output_width: Width the crops are resized to, see crop_regions
+        :param num_images: Number of images cropped side by side
+        :return: Height of the crop displayed below the images, 0 if not zooming
+        """
+        if len(self.zoom_bbox_pts) != 2:
+            return 0
+        _, _, width, height = self._get_crop_region(image_shape)
+        return 0 if width == 0 else int(round(height * output_width / (width * num_images)))
+
+    def crop_regions(
+        self,
+        images: List[np.array],
+        interpolation: int,
+        detail_images: Optional[List[np.array]] = None,
+        output_width: Optional[int] = None,
+    ) -> np.array:
         """
         Crops the input image(s) and resizes width to match the final image width to stack one on the other
         :param images: Images to crop
         :param interpolation: Type of interpolation to use to resize crops
+        :param detail_images: [Optional] Higher resolution versions of images to crop from instead, e.g. original videos
+            when proxies are displayed. The region is still selected in images.
+        :param output_width: [Optional] Width of the final image, if it is not the total width of images
         :return: Cropped and resized image
         """
         if len(self.zoom_bbox_pts) != 2:
@@ -133,10 +179,20 @@ class ZoomManager:
 
         # Crop selected region from the images
         cropped_regions = []
-        for image in images:
+        for idx, image in enumerate(images):
             start_x, start_y, width, height = self._get_crop_region(image.shape)
+            if detail_images is not None:
+                scale = detail_images[idx].shape[0] / image.shape[0]
+                start_x, start_y, width, height = [int(round(value * scale)) for value in (start_x, start_y, width, height)]
+                image = detail_images[idx]
             cropped = image[start_y: start_y + height, start_x: start_x + width, :]
             cropped_regions.append(cropped)
+
+        # High bit depth crops are stretched to show detail beyond 8 bits
+        if all(cropped.dtype != np.uint8 for cropped in cropped_regions):
+            cropped_regions = image_conversions.stretch_to_uint8(cropped_regions)
+        else:
+            cropped_regions = [image_conversions.to_uint8(cropped) for cropped in cropped_regions]
         stacked_crops = np.hstack(cropped_regions)
 
         # Handle invalid crop
@@ -148,6 +204,6 @@ class ZoomManager:
             self.error_message = f"H / W > 2.5. Curr: {round(fh / fw , 1)}"
             return None
 
-        total_length = sum(image.shape[1] for image in images)
+        total_length = output_width if output_width is not None else sum(image.shape[1] for image in images)
         scale = total_length / stacked_crops.shape[1]
         return image_utils.resize_scale(stacked_crops, scale=scale, interpolation=interpolation)
@@ -1,7 +1,11 @@
+from .color_pipeline import *
 from .file_reader import *
 from .file_utils import *
+from .image_cache import *
 from .image_conversions import *
 from .image_utils import *
+from .label_cache import *
+from .media_info import *
 from .trie import *
 from .utils import *
 from .widgets import *
@@ -1,44 +1,159 @@
 import os
+from bisect import bisect_right
+from typing import List, Optional, Tuple
 
 import cv2
 import numpy as np
+from PIL import Image
 
-from ..utils import image_conversions
+from .color_pipeline import get_color_transform
+from .image_conversions import to_uint8
+from .image_cache import shared_image_cache
 
 
-__all__ = ["read_media_file", "ImageCapture", "VideoCapture"]
+__all__ = ["IMAGE_EXTENSIONS", "VIDEO_EXTENSIONS", "read_media_file", "read_thumbnail", "verify_keyframe_seek", "ImageCapture", "VideoCapture"]
 
 
-def read_media_file(file_path, metadata):
+IMAGE_EXTENSIONS = {".png", ".jpg", ".tif"}
+VIDEO_EXTENSIONS = {".mp4", ".avi"}
+
+# Decode scale -> imread flag. JPEG is decoded at the reduced scale directly (DCT scaling).
+REDUCED_IMREAD_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    1: cv2.IMREAD_COLOR,
+}
+
+
+def read_media_file(file_path, metadata, keep_source=False):
+    """
+    Decoded images are taken from and stored in shared_image_cache.
+    :param file_path: Path to image or video
+    :param metadata: Metadata from ffprobe, None if no color conversion is done
+    :param keep_source: If True, images with more than 8 bits are also kept at their original depth, see ImageCapture
+    :return: ImageCapture or VideoCapture object
+    """
     ext = os.path.splitext(os.path.basename(file_path))[-1].lower()
-    if ext in {".png", ".jpg", ".tif"}:
-        capture_obj = ImageCapture(file_path, metadata)
-    elif ext in {".mp4", ".avi"}:
+    if ext in IMAGE_EXTENSIONS:
+        cache_key = shared_image_cache.key(file_path, metadata is not None) if shared_image_cache.enabled else None
+        source_key = cache_key + ("source",) if cache_key is not None and keep_source else None
+        image = shared_image_cache.get(cache_key)
+        if image is not None:
+            # Only high bit depth images have a source. Evicted sources are not decoded again.
+            source = shared_image_cache.get(source_key) if source_key is not None and source_key in shared_image_cache else None
+            return ImageCapture.from_image(image, metadata, source)
+        capture_obj = ImageCapture(file_path, metadata, keep_source)
+        shared_image_cache.put(cache_key, capture_obj.image)
+        shared_image_cache.put(source_key, capture_obj.source)
+    elif ext in VIDEO_EXTENSIONS:
         capture_obj = VideoCapture(file_path, metadata)
     else:
         raise NotImplementedError(f"Unsupported ext for loading image thumbnail: {ext}")
     return capture_obj
 
 
+def read_thumbnail(file_path: str, metadata: Optional[dict], min_height: int) -> Tuple[Optional[np.array], dict]:
+    """
+    Decodes the file at the smallest scale which is still at least min_height tall, for generating thumbnails.
+    Images are read as 8 bit with a reduced imread flag, videos are downscaled before color correction.
+    :param file_path: Path to image or video
+    :param metadata: Metadata from ffprobe, for color correction of videos
+    :param min_height: Minimum height of the returned image, unless the file itself is smaller
+    :return: (BGR image or None if unreadable, info). Info contains the height and width of the file, and frame_count
+        and fps for videos.
+    """
+    ext = os.path.splitext(os.path.basename(file_path))[-1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return _read_image_thumbnail(file_path, min_height)
+    elif ext in VIDEO_EXTENSIONS:
+        return _read_video_thumbnail(file_path, metadata, min_height)
+    raise NotImplementedError(f"Unsupported ext for loading image thumbnail: {ext}")
+
+
+def _read_image_thumbnail(image_path: str, min_height: int) -> Tuple[Optional[np.array], dict]:
+    # Only reads the header
+    try:
+        with Image.open(image_path) as image_pil:
+            width, height = image_pil.size
+    except (OSError, ValueError):
+        width, height = None, None
+
+    scale = 1
+    if height is not None:
+        scale = max(s for s in REDUCED_IMREAD_FLAGS.keys() if s == 1 or height // s >= min_height)
+
+    image = cv2.imread(image_path, REDUCED_IMREAD_FLAGS[scale])
+    if image is None:
+        return None, dict(height=height, width=width)
+    if height is None:
+        height, width = image.shape[:2]
+    return image, dict(height=height, width=width)
+
+
+def _read_video_thumbnail(video_path: str, metadata: Optional[dict], min_height: int) -> Tuple[Optional[np.array], dict]:
+    cap = VideoCapture(video_path, metadata)
+    info = dict(
+        height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        frame_count=int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        fps=round(cap.get(cv2.CAP_PROP_FPS), 2),
+    )
+
+    # Read from the underlying capture so that color correction is only done on the downscaled frame
+    ret, image = cap.cap.read()
+    cap.release()
+    if not ret or image is None:
+        return None, info
+
+    h, w = image.shape[:2]
+    if h > min_height:
+        scale = min_height / h
+        image = cv2.resize(image, (max(1, int(w * scale)), min_height), interpolation=cv2.INTER_AREA)
+    image = cap.color_transform.apply(image, out=image)
+    return image, info
+
+
 class ImageCapture:
     """
-    TODO: Handle HDR Reading too later?
+    Images of any depth are displayed as uint8, see image_conversions.to_uint8.
     """
-    def __init__(self, image_path, metadata):
+    def __init__(self, image_path, metadata, keep_source=False):
+        """
+        :param keep_source: If True, images with more than 8 bits are also kept at their original depth in self.source,
+            e.g. for zoom crops
+        """
         image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
 
-        max_img_val = np.iinfo(image.dtype).max
-        if max_img_val != 255:
-            image = (image.astype(np.float32) / max_img_val * 255.0).clip(0, 255).astype(np.uint8)
+        self.source = image if keep_source and image.dtype != np.uint8 else None
+        image = to_uint8(image)
+
+        # Color transforms only apply to 3 channel images
+        if image.ndim == 3 and image.shape[2] == 3:
+            image = get_color_transform(metadata).apply(image)
 
         self.image = image
         self.metadata = metadata
 
+    @classmethod
+    def from_image(cls, image, metadata, source=None):
+        """
+        Creates an ImageCapture from an already decoded image, e.g. from a cache, without reading the file
+        """
+        capture_obj = cls.__new__(cls)
+        capture_obj.image = image
+        capture_obj.source = source
+        capture_obj.metadata = metadata
+        return capture_obj
+
     def read(self):
         if self.image is None:
             return False, None
 
-        return True, self.image.copy()
+        # Read only view, the image is shared between reads (and possibly other captures)
+        image = self.image.view()
+        image.flags.writeable = False
+        return True, image
 
     def release(self):
         pass
@@ -46,20 +161,47 @@ class ImageCapture:
 
 class VideoCapture:
     def __init__(self, video_path, metadata=None):
+        self.video_path = video_path
         self.cap = cv2.VideoCapture(video_path)
         self.metadata = metadata
+        # Derived once per stream, applied on the thread reading the frames
+        self.color_transform = get_color_transform(metadata)
+        # Sorted indices of keyframes which the capture can seek to directly, see set_keyframes
+        self.keyframes = None
 
     def __getattr__(self, item):
         def method(*args, **kwargs):
             return getattr(self.cap, item)(*args, **kwargs)
         return method
 
-    def is_h264_bt709(self):
-        if self.metadata is None:
-            return False
+    def set_keyframes(self, keyframes: Optional[List[int]]) -> None:
+        """
+        :param keyframes: Sorted indices of keyframes, verified with verify_keyframe_seek. None to only seek sequentially.
+        """
+        self.keyframes = keyframes if keyframes else None
+
+    def seek(self, frame_no: int) -> None:
+        """
+        Positions the capture so that the next read returns frame frame_no.
+        Jumps to the nearest preceding keyframe and grabs the remaining frames, unless grabbing from the current
+        position is shorter. Without keyframes, seeking backwards reopens the file and grabs from the first frame.
+        """
+        current_position = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+        keyframe = 0
+        if self.keyframes is not None:
+            keyframe = self.keyframes[max(0, bisect_right(self.keyframes, frame_no) - 1)]
+            keyframe = min(keyframe, frame_no)
 
-        codec_name, color_space = self.metadata.get("codec_name", None), self.metadata.get("color_space", None)
-        return color_space == "bt709" and codec_name == "h264"
+        if not (current_position <= frame_no and frame_no - current_position <= frame_no - keyframe):
+            if keyframe > 0 and self.cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe) and int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) == keyframe:
+                current_position = keyframe
+            else:
+                self.cap.release()
+                self.cap = cv2.VideoCapture(self.video_path)
+                current_position = 0
+
+        for _ in range(frame_no - current_position):
+            self.cap.grab()
 
     def retrieve(self, *args, **kwargs):
         ret, image = self.cap.retrieve(*args, **kwargs)
@@ -68,12 +210,10 @@ class VideoCapture:
             return ret, image
         if image is None:
             return ret, image
-        if self.metadata is None:
-            return ret, image
-        if not self.is_h264_bt709():
+        if self.color_transform.is_identity:
             return ret, image
 
-        return ret, image_conversions.rectify_h264_bt709_video(image)
+        return ret, self.color_transform.apply(image, out=image)
 
     def read(self, *args, **kwargs):
         ret, image = self.cap.read(*args, **kwargs)
@@ -82,9 +222,42 @@ class VideoCapture:
             return ret, image
         if image is None:
             return ret, image
-        if self.metadata is None:
-            return ret, image
-        if not self.is_h264_bt709():
+        if self.color_transform.is_identity:
             return ret, image
 
-        return ret, image_conversions.rectify_h264_bt709_video(image)
+        return ret, self.color_transform.apply(image, out=image)
+
+
+def verify_keyframe_seek(video_path: str, keyframes: List[int]) -> bool:
+    """
+    Checks that seeking directly to keyframes gives the same frames as decoding sequentially up to them, so that the
+    keyframe index can be trusted for seeking (container indices are in decoding order and OpenCV's frame numbering
+    may differ, e.g. with B-frames). The video is decoded sequentially once, up to the last keyframe.
+    :param video_path: Path to video
+    :param keyframes: Sorted indices of keyframes other than the first frame
+    :return: True if the frames are identical for every keyframe
+    """
+    sequential_frames = []
+    sequential_cap = cv2.VideoCapture(video_path)
+    position = 0
+    for keyframe in keyframes:
+        for _ in range(keyframe - position):
+            sequential_cap.grab()
+        ret, frame = sequential_cap.read()
+        position = keyframe + 1
+        if not ret:
+            sequential_cap.release()
+            return False
+        sequential_frames.append(frame)
+    sequential_cap.release()
+
+    seek_cap = cv2.VideoCapture(video_path)
+    try:
+        for keyframe, sequential_frame in zip(keyframes, sequential_frames):
+            seek_cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+            ret, seek_frame = seek_cap.read()
+            if not ret or not np.array_equal(sequential_frame, seek_frame):
+                return False
+    finally:
+        seek_cap.release()
+    return True
@@ -1,17 +1,18 @@
 import os
 import cv2
-import glob
 import json
-from typing import List
-
-from .utils import do_cmd
+import subprocess
+from typing import Dict, List, Optional, Tuple
 
 
 __all__ = [
     "get_folders",
+    "list_folder",
+    "build_stem_index",
     "get_filenames",
     "complete_paths",
     "get_video_information",
+    "get_video_keyframes",
 ]
 
 
@@ -40,19 +41,55 @@ def get_folders(root, preview_folder) -> List[str]:
     return folders
 
 
-def get_filenames(root: str, folders: List[str]) -> List[str]:
+def list_folder(folder_path: str) -> List[str]:
+    """
+    :param folder_path: Path to folder
+    :return: Names of non-hidden items in the folder
+    """
+    with os.scandir(folder_path) as entries:
+        return [entry.name for entry in entries if entry.name[0] != "."]
+
+
+def build_stem_index(folder_path: str, listing: Optional[List[str]] = None) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """
+    Maps file names without extension (stems) to their full path, from a single pass over the folder.
+    :param folder_path: Path to folder
+    :param listing: [Optional] Pre-computed output of list_folder, e.g. from a catalog
+    :return: (index, ambiguous). Stems shared by multiple files are left out of index and reported in ambiguous
+    """
+    if listing is None:
+        listing = list_folder(folder_path)
+
+    index, ambiguous = {}, {}
+    for name in listing:
+        stem = os.path.splitext(name)[0]
+        path = os.path.join(folder_path, name)
+        if stem in ambiguous:
+            ambiguous[stem].append(path)
+        elif stem in index:
+            ambiguous[stem] = [index.pop(stem), path]
+        else:
+            index[stem] = path
+
+    return index, ambiguous
+
+
+def get_filenames(root: str, folders: List[str], stem_indices: Optional[Dict[str, Dict[str, str]]] = None) -> List[str]:
     """
     Get common files from all sub folders in root folder.
     :param root: Root folder with sub-folders containing images to compare
     :param folders: List of folder names in root dir
+    :param stem_indices: [Optional] Pre-computed index from build_stem_index for each folder
     :return: A list of common files among all folders
     """
     # Finding common files for comparison, should have the same filename (without extension)
     common_files = None
     for folder in folders:
-        folder_path = os.path.join(root, folder)
-        file_paths = [os.path.splitext(file_path)[0] for file_path in os.listdir(folder_path) if file_path[0] != "."]
-        common_files = set(file_paths) if common_files is None else common_files.intersection(set(file_paths))
+        if stem_indices is not None and folder in stem_indices:
+            stem_index = stem_indices[folder]
+        else:
+            stem_index, _ = build_stem_index(os.path.join(root, folder))
+        common_files = set(stem_index.keys()) if common_files is None else common_files.intersection(stem_index.keys())
 
     # Contains files with same names across all sub-directories for comparison
     common_files = list(common_files)
@@ -61,21 +98,54 @@ def get_filenames(root: str, folders: List[str]) -> List[str]:
     return common_files
 
 
-def complete_paths(root, folder, common_names):
-    paths = []
-    for i in range(len(common_names)):
-        uncomplete_path = os.path.join(os.path.join(root, folder), common_names[i]) + ".*"
-        paths.append(glob.glob(uncomplete_path)[0])
-
-    return paths
+def complete_paths(root: str, folder: str, common_names: List[str], stem_index: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    :param root: Root folder with sub-folders containing images to compare
+    :param folder: Folder name in root dir
+    :param common_names: File names without extension
+    :param stem_index: [Optional] Pre-computed index from build_stem_index for the folder
+    :return: Full paths of the files
+    """
+    if stem_index is None:
+        stem_index, _ = build_stem_index(os.path.join(root, folder))
+    return [stem_index[name] for name in common_names]
 
 
 def get_video_information(file_path):
-    command = 'ffprobe -print_format json -show_streams -v quiet {}'.format(file_path)
-    retcode, stdout, _ = do_cmd(command)
-    if retcode == 0:
-        obj = json.loads(stdout)
-        if len(obj["streams"]) > 0:
+    """
+    Runs ffprobe (without a shell) on the file.
+    :param file_path: Path to video
+    :return: Information of the first video stream as reported by ffprobe, empty if unavailable
+    """
+    command = ["ffprobe", "-print_format", "json", "-show_streams", "-select_streams", "v:0", "-v", "quiet", file_path]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        # ffprobe not installed
+        return {}
+
+    if result.returncode == 0:
+        obj = json.loads(result.stdout)
+        if len(obj.get("streams", [])) > 0:
             return obj["streams"][0]
 
     return {}
+
+
+def get_video_keyframes(file_path) -> Optional[List[int]]:
+    """
+    Runs ffprobe (without a shell) to list the packets of the first video stream. Only demuxes, does not decode.
+    :param file_path: Path to video
+    :return: 0-based indices of the keyframes in decoding order, None if unavailable
+    """
+    command = ["ffprobe", "-v", "quiet", "-select_streams", "v:0", "-show_entries", "packet=flags", "-of", "csv=p=0", file_path]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        # ffprobe not installed
+        return None
+
+    if result.returncode != 0:
+        return None
+    packet_flags = result.stdout.decode("utf-8").split()
+    return [idx for idx, flags in enumerate(packet_flags) if "K" in flags]
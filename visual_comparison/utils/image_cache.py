@@ -0,0 +1,110 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+import numpy as np
+
+
+__all__ = ["ImageCache", "shared_image_cache"]
+
+
+class ImageCache:
+    """
+    LRU cache of decoded images bounded by their total size in bytes, shared by the whole process.
+    Images are keyed by path, size, mtime and whether color conversion is done, so modified files are decoded again.
+    Cached images are read only, copy them before drawing on them.
+    """
+    def __init__(self, memory_budget_mb: int = 0):
+        """
+        :param memory_budget_mb: Maximum total size of the cached images in MB. Nothing is cached if 0.
+        """
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.images = OrderedDict()  # key -> image, least recently used first
+        self.size = 0
+        self.hits, self.misses = 0, 0
+        self.lock = threading.Lock()
+
+    def set_memory_budget(self, memory_budget_mb: int) -> None:
+        with self.lock:
+            self.memory_budget = memory_budget_mb * 1024 * 1024
+            self._evict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_budget > 0
+
+    @staticmethod
+    def key(file_path: str, color_conversion: bool) -> Optional[tuple]:
+        """
+        :param file_path: Path to image
+        :param color_conversion: Whether the image is read with color conversion
+        :return: Cache key, or None if the file does not exist
+        """
+        try:
+            stat_result = os.stat(file_path)
+        except OSError:
+            return None
+        return os.path.abspath(file_path), stat_result.st_size, stat_result.st_mtime_ns, color_conversion
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.images
+
+    def get(self, key: Optional[Hashable]) -> Optional[np.array]:
+        """
+        :return: Cached image, or None if not cached
+        """
+        if key is None or not self.enabled:
+            return None
+
+        with self.lock:
+            image = self.images.get(key, None)
+            if image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.images.move_to_end(key)
+        return image
+
+    def put(self, key: Optional[Hashable], image: Optional[np.array]) -> None:
+        """
+        Inserts the image, evicting the least recently used ones to stay within budget.
+        """
+        if key is None or image is None:
+            return
+
+        with self.lock:
+            if image.nbytes > self.memory_budget:
+                return
+            image.flags.writeable = False
+
+            if key in self.images:
+                self.size -= self.images.pop(key).nbytes
+            self.images[key] = image
+            self.size += image.nbytes
+            self._evict()
+
+    def _evict(self) -> None:
+        """
+        Requires self.lock
+        """
+        while self.size > self.memory_budget:
+            _, evicted = self.images.popitem(last=False)
+            self.size -= evicted.nbytes
+
+    def clear(self) -> None:
+        with self.lock:
+            self.images.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        """
+        :return: dict(hits, misses, count, size, memory_budget). Sizes are in bytes.
+        """
+        with self.lock:
+            return dict(hits=self.hits, misses=self.misses, count=len(self.images), size=self.size, memory_budget=self.memory_budget)
+
+
+# Process wide instance used by read_media_file. Disabled until a budget is set.
+shared_image_cache = ImageCache()
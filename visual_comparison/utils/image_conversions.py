@@ -1,15 +1,61 @@
+from typing import List
+
 import numpy as np
 
 
-__all__ = ["rectify_h264_bt709_video"]
+__all__ = ["to_uint8", "stretch_to_uint8"]
+
+
+# uint16 -> uint8, rounded
+UINT16_TO_UINT8 = np.round(np.arange(65536) * (255 / 65535)).astype(np.uint8)
+# Rows converted at a time for other depths, bounds the size of float temporaries
+CONVERSION_CHUNK_ROWS = 256
+
+
+def _scale_to_uint8(image: np.array, offset: float, scale: float) -> np.array:
+    """
+    (image - offset) * scale, rounded and clipped to uint8. Converted in chunks of rows, the input is not modified.
+    """
+    output = np.empty(image.shape, dtype=np.uint8)
+    for start in range(0, image.shape[0], CONVERSION_CHUNK_ROWS):
+        chunk = image[start:start + CONVERSION_CHUNK_ROWS].astype(np.float32)
+        chunk -= offset
+        chunk *= scale
+        np.nan_to_num(chunk, copy=False)
+        np.rint(chunk, out=chunk)
+        np.clip(chunk, 0, 255, out=chunk)
+        output[start:start + CONVERSION_CHUNK_ROWS] = chunk
+    return output
+
+
+def to_uint8(image: np.array) -> np.array:
+    """
+    Converts an image of any depth to uint8 for display, without full size float temporaries.
+    uint16 is mapped with a lookup table, other integer types are scaled by their maximum value and floats
+    (e.g. 32 bit TIFF) are expected to be in [0, 1].
+    :param image: Image to convert, returned as is if already uint8
+    :return: uint8 image
+    """
+    if image.dtype == np.uint8:
+        return image
+    if image.dtype == np.uint16:
+        return UINT16_TO_UINT8[image]
+    if np.issubdtype(image.dtype, np.floating):
+        return _scale_to_uint8(image, 0, 255.0)
+    return _scale_to_uint8(image, 0, 255.0 / np.iinfo(image.dtype).max)
 
 
-def rectify_h264_bt709_video(bgr_image: np.array) -> np.array:
+def stretch_to_uint8(images: List[np.array]) -> List[np.array]:
     """
-    Rectifies BT709 h264 videos (Issue with OpenCV)
+    Converts high bit depth images to uint8, stretching their common value range to [0, 255] so that detail beyond
+    8 bits is visible. Used for zoom crops, images are compared with the same mapping.
+    :param images: Images of the same depth
+    :return: uint8 images
     """
-    out_img = np.zeros_like(bgr_image, dtype=np.float32)
-    out_img[:, :, 2] = 1.086275 * bgr_image[:, :, 2] - 0.073168 * bgr_image[:, :, 1] - 0.013231 * bgr_image[:, :, 0]
-    out_img[:, :, 1] = 0.096685 * bgr_image[:, :, 2] + 0.844783 * bgr_image[:, :, 1] + 0.058408 * bgr_image[:, :, 0]
-    out_img[:, :, 0] = -0.013428 * bgr_image[:, :, 2] - 0.027936 * bgr_image[:, :, 1] + 1.04124 * bgr_image[:, :, 0]
-    return np.clip(out_img, 0, 255).astype(np.uint8)
+    if len(images) == 0 or images[0].dtype == np.uint8:
+        return images
+    low = min(float(np.nanmin(image)) for image in images)
+    high = max(float(np.nanmax(image)) for image in images)
+    scale = 255.0 / (high - low) if high > low else 0.0
+    return [_scale_to_uint8(image, low, scale) for image in images]
+
@@ -1,10 +1,12 @@
 import sys
 import os
 import enum
+import math
 import platform
 import subprocess
 from io import BytesIO
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Union
 
 import cv2
 import numpy as np
@@ -24,10 +26,16 @@ except ImportError as err:
 
 __all__ = [
     "TextPosition",
+    "get_text_scale",
+    "get_text_position",
     "put_text",
     "merge_crop",
+    "get_split_regions",
+    "get_sector_masks",
+    "get_sector_anchors",
     "merge_multiple_images",
-    "resize_scale"
+    "resize_scale",
+    "resize_to_height",
 ]
 
 
@@ -43,34 +51,15 @@ class TextPosition(enum.Enum):
     BTM_RIGHT = enum.auto()
 
 
-def put_text(
-    img: np.array,
-    text: str,
-    position: TextPosition = TextPosition.TOP_LEFT,
-    buffer=5,
-    font=cv2.FONT_HERSHEY_DUPLEX,
-    scale=1,
-    thickness=1,
-    bg_color: Tuple[int, int, int] = (0, 0, 0),
-    fg_color: Tuple[int, int, int] = (255, 255, 255),
-    background: Optional[int] = None,
-    ) -> np.array:
+def get_text_scale(img_width: int, text: str, font=cv2.FONT_HERSHEY_DUPLEX, scale=1) -> float:
     """
-    Writes text in image according to the specified position
-    :param img: Image to write on
-    :param text: Text you wish to place onto the image
-    :param position: TextPosition enum
-    :param buffer: Buffer from the sides of the image
+    Calculates actual scale required to set text size the same for imgs of different sizes, see put_text
+    :param img_width: Width of the image to write on
+    :param text: Text to write
     :param font: font required by cv2.putText
-    :param scale: scale required by cv2.putText
-    :param thickness: thickness required by cv2.putText
-    :param bg_color: background text color in BGR [0, 255]
-    :param fg_color: foreground text color in BGR [0, 255]
-    :param background: sets background for text to value
-    :return: Output image containing the text.
+    :param scale: Relative scale of the text
+    :return: fontScale for cv2.putText
     """
-
-    # Calculates actual scale required to set text size the same for imgs of different sizes
     font_scale = {
         cv2.FONT_HERSHEY_SIMPLEX: 1.0969,
         cv2.FONT_HERSHEY_PLAIN: 2.1608,
@@ -83,13 +72,32 @@ def put_text(
     }.get(font)
     # 0.4 = Scale needed for fitting 40 hershey complex characters in 360 pixel width img
     num_chars_scalar = 0.40 / (max(len(text), 40) / 40.0)
-    width_scale = min((img.shape[1] / 360.0), 2)  # Cap if not too big
-    actual_scale = scale * num_chars_scalar * width_scale * font_scale
+    width_scale = min((img_width / 360.0), 2)  # Cap if not too big
+    return scale * num_chars_scalar * width_scale * font_scale
 
-    (text_width, text_height), _ = cv2.getTextSize(text, font, actual_scale, thickness)
-    img_height, img_width, _ = img.shape
 
-    if position == TextPosition.TOP_LEFT:
+def get_text_position(
+    img_shape: np.shape,
+    text_size: Tuple[int, int],
+    position: Union[TextPosition, Tuple[int, int]] = TextPosition.TOP_LEFT,
+    buffer=5,
+    ) -> Tuple[int, int]:
+    """
+    :param img_shape: Shape of the image to write on
+    :param text_size: (width, height) of the text from cv2.getTextSize
+    :param position: TextPosition enum, or (x, y) to centre the text on (kept within the image)
+    :param buffer: Buffer from the sides of the image
+    :return: Bottom left corner of the text, as required by cv2.putText
+    """
+    text_width, text_height = text_size
+    img_height, img_width = img_shape[:2]
+
+    if isinstance(position, tuple):
+        text_position = (
+            min(max(buffer, position[0] - text_width // 2), img_width - text_width - buffer),
+            min(max(buffer + text_height, position[1] + text_height // 2), img_height - buffer),
+        )
+    elif position == TextPosition.TOP_LEFT:
         text_position = (buffer, buffer + text_height)
     elif position == TextPosition.TOP_CENTER:
         text_position = (img_width // 2 - text_width // 2, buffer + text_height)
@@ -107,6 +115,39 @@ def put_text(
         text_position = (img_width // 2 - text_width // 2, img_height - text_height - buffer)
     else:
         text_position = (img_width - text_width - buffer, img_height - text_height - buffer)
+    return text_position
+
+
+def put_text(
+    img: np.array,
+    text: str,
+    position: Union[TextPosition, Tuple[int, int]] = TextPosition.TOP_LEFT,
+    buffer=5,
+    font=cv2.FONT_HERSHEY_DUPLEX,
+    scale=1,
+    thickness=1,
+    bg_color: Tuple[int, int, int] = (0, 0, 0),
+    fg_color: Tuple[int, int, int] = (255, 255, 255),
+    background: Optional[int] = None,
+    ) -> Tuple[int, int, int, int]:
+    """
+    Writes text in image according to the specified position
+    :param img: Image to write on
+    :param text: Text you wish to place onto the image
+    :param position: TextPosition enum, or (x, y) to centre the text on (kept within the image)
+    :param buffer: Buffer from the sides of the image
+    :param font: font required by cv2.putText
+    :param scale: scale required by cv2.putText
+    :param thickness: thickness required by cv2.putText
+    :param bg_color: background text color in BGR [0, 255]
+    :param fg_color: foreground text color in BGR [0, 255]
+    :param background: sets background for text to value
+    :return: (x0, y0, x1, y1) bounds of the area drawn on, may extend beyond the image
+    """
+
+    actual_scale = get_text_scale(img.shape[1], text, font, scale)
+    (text_width, text_height), baseline = cv2.getTextSize(text, font, actual_scale, thickness)
+    text_position = get_text_position(img.shape, (text_width, text_height), position, buffer)
 
     if background is not None:
         # text position = bottom right corner of bbox to put text in
@@ -120,6 +161,13 @@ def put_text(
     cv2.putText(img, text, text_position, font, actual_scale, bg_color, thickness + 1)
     cv2.putText(img, text, text_position, font, actual_scale, fg_color, thickness)
 
+    return (
+        text_position[0] - buffer - thickness,
+        text_position[1] - text_height - buffer - thickness,
+        text_position[0] + text_width + buffer + thickness,
+        text_position[1] + baseline + buffer + thickness,
+    )
+
 
 def merge_crop(img1: np.array, img2: np.array, position: Tuple[int, int], direction: str) -> np.array:
     """
@@ -151,30 +199,122 @@ def merge_crop(img1: np.array, img2: np.array, position: Tuple[int, int], direct
     return output_img
 
 
-def merge_multiple_images(image_list: List[np.array], position: Tuple[int, int]) -> np.array:
+def get_split_regions(num_images: int, width: int, height: int, position: Tuple[int, int]) -> List[Tuple[int, int, int, int, int]]:
     """
-    Merges up to 4 images. Order of images determines position in final image.
+    Regions shown by each image when splitting the view at position, see merge_multiple_images.
+    :param num_images: Number of images, up to 4
+    :param width: Width of the images
+    :param height: Height of the images
+    :param position: Position at which to partition the images
+    :return: List of (image index, x0, y0, x1, y1)
+    """
+    x, y = position
+    if num_images == 1:
+        return [(0, 0, 0, width, height)]
+    elif num_images == 2:
+        return [(0, 0, 0, x, height), (1, x, 0, width, height)]
+    elif num_images == 3:
+        return [(0, 0, 0, x, y), (1, x, 0, width, y), (2, 0, y, width, height)]
+    elif num_images == 4:
+        return [(0, 0, 0, x, y), (1, x, 0, width, y), (2, 0, y, x, height), (3, x, y, width, height)]
+    raise ValueError(f"Only able to merge up to 4 images. len(image_list) = {num_images}")
 
-    idx 0, 1, 2, 3 -> Top Left, Top Right, Btm Left, Btm Right
-    :param image_list: List of images to merge
+
+# Rows of the sector masks computed at a time, bounds the size of float temporaries
+SECTOR_MAP_CHUNK_ROWS = 256
+
+
+@lru_cache(maxsize=4)
+def get_sector_masks(num_images: int, x0: int, y0: int, x1: int, y1: int) -> List[Tuple[int, int, int, int, int, np.array]]:
+    """
+    Splits a region into equal wedges around the split position. Wedges start on the left of the position and go
+    clockwise, so 4 wedges are ordered like the quadrants of merge_multiple_images.
+    Only depends on the region relative to the position, so it is computed once while neither of them moves.
+    :param num_images: Number of wedges
+    :param x0: Left of the region, relative to the split position
+    :param y0: Top of the region, relative to the split position
+    :param x1: Right of the region (exclusive), relative to the split position
+    :param y1: Bottom of the region (exclusive), relative to the split position
+    :return: (index, y0, y1, x0, x1, mask) of every wedge within the region. Bounds are relative to the region and mask
+        is a read only (y1 - y0, x1 - x0, 1) bool array of the pixels of the wedge within them.
+    """
+    sector_map = np.empty((y1 - y0, x1 - x0), dtype=np.uint8)
+    dx = np.arange(x0, x1, dtype=np.float32)[None, :]
+    for start in range(0, y1 - y0, SECTOR_MAP_CHUNK_ROWS):
+        dy = np.arange(y0 + start, min(y0 + start + SECTOR_MAP_CHUNK_ROWS, y1), dtype=np.float32)[:, None]
+        # Clockwise angle from the left, in [0, 2 pi)
+        angle = np.arctan2(dy, dx)
+        angle += math.pi
+        angle *= num_images / (2 * math.pi)
+        sector_map[start: start + SECTOR_MAP_CHUNK_ROWS] = np.minimum(angle, num_images - 1)
+
+    sectors = []
+    for idx in range(num_images):
+        mask = sector_map == idx
+        rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+        if len(rows) == 0:
+            continue
+        m_y0, m_y1, m_x0, m_x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        mask = mask[m_y0: m_y1, m_x0: m_x1, None].copy()
+        mask.flags.writeable = False
+        sectors.append((idx, m_y0, m_y1, m_x0, m_x1, mask))
+    return sectors
+
+
+def get_sector_anchors(num_images: int, width: int, height: int, position: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """
+    :return: (x, y) in the middle of every wedge around position, e.g. for titles. See get_sector_masks.
+    """
+    radius = min(width, height) / 4
+    anchors = []
+    for idx in range(num_images):
+        angle = (idx + 0.5) * 2 * math.pi / num_images - math.pi
+        anchors.append((int(position[0] + radius * math.cos(angle)), int(position[1] + radius * math.sin(angle))))
+    return anchors
+
+
+def merge_multiple_images(
+    image_list: List[np.array],
+    position: Tuple[int, int],
+    out: Optional[np.array] = None,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    ) -> np.array:
+    """
+    Merges images. Order of images determines position in final image.
+    Each part is copied directly from its image into the output, the images are not modified.
+
+    Up to 4: idx 0, 1, 2, 3 -> Top Left, Top Right, Btm Left, Btm Right
+    More than 4: Equal wedges around position, clockwise from the left (see get_sector_masks). Each wedge is copied
+        from its image within its bounding box only, so every output pixel is written about once.
+    :param image_list: List of images to merge, of the same shape
     :param position: Position at which to partition the images and merge.
+    :param out: [Optional] Output buffer with the same shape and type as the images. Allocated if None.
+    :param region: [Optional] (x0, y0, x1, y1), only this part of the output is written
     :return: Merged image.
     """
-    if len(image_list) == 1:
-        output_image = image_list[0]
-    elif len(image_list) == 2:
-        output_image = merge_crop(image_list[0].copy(), image_list[1].copy(), position, "x")
-    elif len(image_list) == 3:
-        merge01 = merge_crop(image_list[0].copy(), image_list[1].copy(), position, "x")
-        output_image = merge_crop(merge01, image_list[2].copy(), position, "y")
-    elif len(image_list) == 4:
-        merge01 = merge_crop(image_list[0].copy(), image_list[1].copy(), position, "x")
-        merge23 = merge_crop(image_list[2].copy(), image_list[3].copy(), position, "x")
-        output_image = merge_crop(merge01, merge23, position, "y")
-    else:
-        raise ValueError(f"Only able to merge up to 4 images. len(image_list) = {len(image_list)}")
+    height, width = image_list[0].shape[:2]
+    x, y = position
+    assert x < width and y < height, "Provided postion out of bounds"
+
+    if out is None:
+        out = np.empty_like(image_list[0])
+    r_x0, r_y0, r_x1, r_y1 = region if region is not None else (0, 0, width, height)
 
-    return output_image
+    if len(image_list) > 4:
+        r_x0, r_y0, r_x1, r_y1 = max(r_x0, 0), max(r_y0, 0), min(r_x1, width), min(r_y1, height)
+        if r_x0 >= r_x1 or r_y0 >= r_y1:
+            return out
+        for idx, y0, y1, x0, x1, mask in get_sector_masks(len(image_list), r_x0 - x, r_y0 - y, r_x1 - x, r_y1 - y):
+            y0, y1, x0, x1 = r_y0 + y0, r_y0 + y1, r_x0 + x0, r_x0 + x1
+            np.copyto(out[y0: y1, x0: x1], image_list[idx][y0: y1, x0: x1], where=mask)
+        return out
+
+    for idx, x0, y0, x1, y1 in get_split_regions(len(image_list), width, height, position):
+        x0, y0, x1, y1 = max(x0, r_x0), max(y0, r_y0), min(x1, r_x1), min(y1, r_y1)
+        if x0 < x1 and y0 < y1:
+            out[y0: y1, x0: x1] = image_list[idx][y0: y1, x0: x1]
+
+    return out
 
 
 def resize_scale(image, scale, interpolation=cv2.INTER_LINEAR):
@@ -191,6 +331,21 @@ def resize_scale(image, scale, interpolation=cv2.INTER_LINEAR):
     return image
 
 
+def resize_to_height(image, height, interpolation=cv2.INTER_AREA):
+    """
+    Resize an image to the given height, keeping the aspect ratio
+    :param image: Image to resize
+    :param height: Desired height
+    :param interpolation: Interpolation method for resize operation.
+    :return: Resized image
+    """
+    h, w = image.shape[:2]
+    if h == height:
+        return image
+    new_shape = (max(1, int(w * height / h)), height)
+    return cv2.resize(image, new_shape, interpolation=interpolation)
+
+
 def image_to_clipboard(image):
     operating_system = platform.system()
 
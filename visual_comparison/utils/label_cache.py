@@ -0,0 +1,100 @@
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from . import image_utils
+from .image_utils import TextPosition
+
+
+__all__ = ["LabelCache"]
+
+
+class LabelCache:
+    """
+    Text labels (titles, recording HUD) rendered once into small BGRA patches, which are blitted onto images instead
+    of drawing the text with cv2.putText every time. Labels look the same as with image_utils.put_text.
+
+    Patches depend on the text and the width of the image it is written on. The cache is cleared when other methods
+    are loaded, and once it holds max_patches, e.g. after the display size changed.
+    """
+    def __init__(self, max_patches: int = 64):
+        """
+        :param max_patches: Maximum number of patches kept
+        """
+        self.max_patches = max_patches
+        self.patches = dict()  # key -> (BGR patch, mask, (x, y) of the text in the patch, (text width, text height))
+
+    def clear(self) -> None:
+        self.patches.clear()
+
+    @staticmethod
+    def _render(text: str, font: int, actual_scale: float, thickness: int, buffer: int, bg_color: Tuple[int, int, int],
+                fg_color: Tuple[int, int, int], background: Optional[int]) -> tuple:
+        (text_width, text_height), baseline = cv2.getTextSize(text, font, actual_scale, thickness)
+        margin = buffer + thickness + 1
+        origin = (margin, margin + text_height)
+        patch = np.zeros((text_height + baseline + 2 * margin, text_width + 2 * margin, 4), dtype=np.uint8)
+
+        if background is not None:
+            patch[origin[1] - text_height - buffer: origin[1] + buffer, origin[0] - buffer: origin[0] + text_width + buffer] = (background, background, background, 255)
+
+        # Drawn without anti-aliasing like put_text, so alpha is either 0 or 255
+        cv2.putText(patch, text, origin, font, actual_scale, (*bg_color, 255), thickness + 1)
+        cv2.putText(patch, text, origin, font, actual_scale, (*fg_color, 255), thickness)
+        return np.ascontiguousarray(patch[..., :3]), patch[..., 3:] > 0, origin, (text_width, text_height)
+
+    def put_text(
+        self,
+        img: np.array,
+        text: str,
+        position: Union[TextPosition, Tuple[int, int]] = TextPosition.TOP_LEFT,
+        buffer=5,
+        font=cv2.FONT_HERSHEY_DUPLEX,
+        scale=1,
+        thickness=1,
+        bg_color: Tuple[int, int, int] = (0, 0, 0),
+        fg_color: Tuple[int, int, int] = (255, 255, 255),
+        background: Optional[int] = None,
+    ) -> Tuple[int, int, int, int]:
+        """
+        Writes text in image according to the specified position, see image_utils.put_text for the parameters.
+        Only the colour channels of BGRA images are written.
+        :return: (x0, y0, x1, y1) bounds of the area drawn on, may extend beyond the image
+        """
+        actual_scale = image_utils.get_text_scale(img.shape[1], text, font, scale)
+        key = (text, font, actual_scale, thickness, buffer, bg_color, fg_color, background)
+        entry = self.patches.get(key, None)
+        if entry is None:
+            if len(self.patches) >= self.max_patches:
+                self.patches.clear()
+            entry = self._render(text, font, actual_scale, thickness, buffer, bg_color, fg_color, background)
+            self.patches[key] = entry
+        patch, mask, (origin_x, origin_y), text_size = entry
+
+        text_x, text_y = image_utils.get_text_position(img.shape, text_size, position, buffer)
+        x0, y0 = text_x - origin_x, text_y - origin_y
+        x1, y1 = x0 + patch.shape[1], y0 + patch.shape[0]
+
+        # Only the part of the patch within the image
+        img_height, img_width = img.shape[:2]
+        c_x0, c_y0, c_x1, c_y1 = max(x0, 0), max(y0, 0), min(x1, img_width), min(y1, img_height)
+        if c_x0 < c_x1 and c_y0 < c_y1:
+            patch_region = (slice(c_y0 - y0, c_y1 - y0), slice(c_x0 - x0, c_x1 - x0))
+            np.copyto(img[c_y0: c_y1, c_x0: c_x1, :3], patch[patch_region], where=mask[patch_region])
+        return x0, y0, x1, y1
+
+
+if __name__ == "__main__":
+    # Labels match image_utils.put_text on BGR and BGRA images: python -m visual_comparison.utils.label_cache
+    label_cache = LabelCache()
+    for channels in (3, 4):
+        for position in (TextPosition.TOP_LEFT, TextPosition.MIDDLE_RIGHT, (590, 395)):
+            for background in (None, 0):
+                image = np.random.randint(0, 256, (400, 600, channels), dtype=np.uint8)
+                expected, actual = image.copy(), image.copy()
+                image_utils.put_text(expected, "Method", position, background=background)
+                label_cache.put_text(actual, "Method", position, background=background)
+                assert np.array_equal(expected[..., :3], actual[..., :3]), (channels, position, background)
+                assert np.array_equal(image[..., 3:], actual[..., 3:]), (channels, position, background)
+    print("LabelCache matches image_utils.put_text")
@@ -0,0 +1,240 @@
+import os
+import struct
+from typing import Iterator, List, Optional, Tuple
+
+
+__all__ = ["read_container_metadata", "read_container_keyframes"]
+
+
+# ISO/IEC 14496-12 sample entry types -> ffprobe codec names
+MP4_CODEC_NAMES = {
+    b"avc1": "h264",
+    b"avc3": "h264",
+    b"hvc1": "hevc",
+    b"hev1": "hevc",
+    b"av01": "av1",
+    b"vp09": "vp9",
+    b"mp4v": "mpeg4",
+}
+
+# ITU-T H.273 code points -> ffprobe names
+COLOR_SPACES = {0: "gbr", 1: "bt709", 4: "fcc", 5: "bt470bg", 6: "smpte170m", 7: "smpte240m", 9: "bt2020nc", 10: "bt2020c"}
+COLOR_PRIMARIES = {1: "bt709", 4: "bt470m", 5: "bt470bg", 6: "smpte170m", 7: "smpte240m", 9: "bt2020"}
+COLOR_TRANSFERS = {1: "bt709", 4: "gamma22", 5: "gamma28", 6: "smpte170m", 7: "smpte240m", 8: "linear", 13: "iec61966-2-1", 16: "smpte2084", 18: "arib-std-b67"}
+
+# Container boxes we need to descend into to reach the sample description
+MP4_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+MP4_EXTENSIONS = {".mp4", ".m4v", ".mov"}
+
+
+def _iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    :return: (box type, payload start, payload end) for every box between start and end
+    """
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[offset:offset + 8])
+        header_size = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack(">Q", data[offset + 8:offset + 16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+
+        if size < header_size or offset + size > end:
+            return
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _read_moov(file) -> Optional[bytes]:
+    """
+    Seeks through the top level boxes of the file and reads the moov box, which may be at the start or end.
+    """
+    file_size = os.fstat(file.fileno()).st_size
+    offset = 0
+    while offset + 8 <= file_size:
+        file.seek(offset)
+        header = file.read(16)
+        if len(header) < 8:
+            return None
+        size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                return None
+            size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - offset
+        if size < header_size:
+            return None
+
+        if box_type == b"moov":
+            file.seek(offset + header_size)
+            return file.read(size - header_size)
+        offset += size
+    return None
+
+
+def _parse_video_sample_entry(data: bytes, start: int, end: int) -> dict:
+    """
+    Parses a VisualSampleEntry (stsd child) into a dictionary with the same keys as an ffprobe stream.
+    """
+    box_type = None
+    for box_type, entry_start, entry_end in _iter_boxes(data, start, end):
+        break
+    if box_type not in MP4_CODEC_NAMES:
+        return {}
+
+    # 6 reserved bytes + data_reference_index, 16 bytes of pre_defined/reserved, then width and height
+    width, height = struct.unpack(">HH", data[entry_start + 24:entry_start + 28])
+    stream = dict(codec_type="video", codec_name=MP4_CODEC_NAMES[box_type], codec_tag_string=box_type.decode("ascii"), width=width, height=height)
+
+    # Child boxes follow the 78 byte visual sample entry header
+    for child_type, child_start, child_end in _iter_boxes(data, entry_start + 78, entry_end):
+        if child_type != b"colr" or data[child_start:child_start + 4] != b"nclx":
+            continue
+        primaries, transfer, matrix, range_flags = struct.unpack(">HHHB", data[child_start + 4:child_start + 11])
+        stream["color_range"] = "pc" if range_flags & 0x80 else "tv"
+        if matrix in COLOR_SPACES:
+            stream["color_space"] = COLOR_SPACES[matrix]
+        if primaries in COLOR_PRIMARIES:
+            stream["color_primaries"] = COLOR_PRIMARIES[primaries]
+        if transfer in COLOR_TRANSFERS:
+            stream["color_transfer"] = COLOR_TRANSFERS[transfer]
+    return stream
+
+
+def _find_video_sample_table(data: bytes, start: int, end: int) -> Optional[Tuple[int, int]]:
+    """
+    Walks the box tree and returns the byte range of the first video track's sample table (stbl) payload.
+    """
+    for box_type, box_start, box_end in _iter_boxes(data, start, end):
+        if box_type == b"trak":
+            handler, sample_table = None, None
+            for mdia_type, mdia_start, mdia_end in _iter_boxes(data, box_start, box_end):
+                if mdia_type != b"mdia":
+                    continue
+                for child_type, child_start, child_end in _iter_boxes(data, mdia_start, mdia_end):
+                    if child_type == b"hdlr":
+                        # version/flags (4) + pre_defined (4)
+                        handler = data[child_start + 8:child_start + 12]
+                    elif child_type == b"minf":
+                        sample_table = _find_child(data, child_start, child_end, b"stbl")
+            if handler == b"vide" and sample_table is not None:
+                return sample_table
+        elif box_type in MP4_CONTAINER_BOXES:
+            sample_table = _find_video_sample_table(data, box_start, box_end)
+            if sample_table is not None:
+                return sample_table
+    return None
+
+
+def _find_child(data: bytes, start: int, end: int, child_type: bytes) -> Optional[Tuple[int, int]]:
+    """
+    :return: Byte range of the payload of the first child box of the given type
+    """
+    for box_type, box_start, box_end in _iter_boxes(data, start, end):
+        if box_type == child_type:
+            return box_start, box_end
+    return None
+
+
+def _find_video_stream(data: bytes, start: int, end: int) -> Optional[dict]:
+    """
+    :return: First video track's sample entry, parsed by _parse_video_sample_entry
+    """
+    sample_table = _find_video_sample_table(data, start, end)
+    if sample_table is None:
+        return None
+    sample_description = _find_child(data, *sample_table, b"stsd")
+    if sample_description is None:
+        return None
+    # version/flags (4) + entry_count (4)
+    return _parse_video_sample_entry(data, sample_description[0] + 8, sample_description[1])
+
+
+def _find_keyframes(data: bytes, start: int, end: int) -> Optional[List[int]]:
+    """
+    :return: 0-based indices of the first video track's sync samples (keyframes), in decoding order
+    """
+    sample_table = _find_video_sample_table(data, start, end)
+    if sample_table is None:
+        return None
+
+    sync_samples = _find_child(data, *sample_table, b"stss")
+    if sync_samples is not None:
+        # version/flags (4) + entry_count (4), then 1-based sample numbers
+        entry_count = struct.unpack(">I", data[sync_samples[0] + 4:sync_samples[0] + 8])[0]
+        entries = struct.unpack(f">{entry_count}I", data[sync_samples[0] + 8:sync_samples[0] + 8 + 4 * entry_count])
+        return [sample - 1 for sample in entries]
+
+    # Without a sync sample box, every sample is a keyframe
+    sample_sizes = _find_child(data, *sample_table, b"stsz")
+    if sample_sizes is None:
+        return None
+    # version/flags (4) + sample_size (4) + sample_count (4)
+    sample_count = struct.unpack(">I", data[sample_sizes[0] + 8:sample_sizes[0] + 12])[0]
+    return list(range(sample_count))
+
+
+def _read_container(file_path: str) -> Optional[bytes]:
+    """
+    :return: Payload of the moov box of MP4/MOV files, or None if unsupported or unreadable
+    """
+    if os.path.splitext(file_path)[-1].lower() not in MP4_EXTENSIONS:
+        return None
+
+    try:
+        with open(file_path, "rb") as file:
+            return _read_moov(file)
+    except OSError:
+        return None
+
+
+def read_container_metadata(file_path: str) -> Optional[dict]:
+    """
+    Reads codec and color information of the first video stream from the container header, without spawning ffprobe.
+    Only MP4/MOV files are supported. Color information is taken from the 'colr' box.
+    :param file_path: Path to video
+    :return: Dictionary with the same keys as ffprobe's stream info, or None if the information cannot be read
+        from the header (unsupported container, no colour box, full range, malformed file), in which case ffprobe
+        should be used.
+    """
+    moov = _read_container(file_path)
+    if moov is None:
+        return None
+
+    try:
+        stream = _find_video_stream(moov, 0, len(moov))
+    except struct.error:
+        return None
+
+    # Color information may only be in the bitstream, leave that to ffprobe
+    if not stream or "color_space" not in stream:
+        return None
+    # Full range conversion depends on the decoded pixel format, which is only known by ffprobe
+    if stream["color_range"] == "pc":
+        return None
+    return stream
+
+
+def read_container_keyframes(file_path: str) -> Optional[List[int]]:
+    """
+    Reads the keyframe (sync sample) table of the first video stream from the container header.
+    Only MP4/MOV files are supported.
+    :param file_path: Path to video
+    :return: Sorted 0-based frame indices of the keyframes, or None if they cannot be read from the header
+    """
+    moov = _read_container(file_path)
+    if moov is None:
+        return None
+
+    try:
+        return _find_keyframes(moov, 0, len(moov))
+    except struct.error:
+        return None
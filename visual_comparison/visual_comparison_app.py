@@ -1,8 +1,9 @@
 import os
+import math
 import time
 import tkinter
 from tkinter import filedialog
-from typing import Optional
+from typing import List, Optional, Tuple
 import dataclasses
 import platform
 from threading import Thread
@@ -43,6 +44,7 @@ class VisualComparisonApp(customtkinter.CTk):
 
         utils.set_appearance_mode_and_theme(self.configurations["Appearance"]["mode"], self.configurations["Appearance"]["theme"])
         utils.set_tkinter_widgets_appearance_mode(self)
+        utils.shared_image_cache.set_memory_budget(self.configurations["Cache"]["image_cache_mb"])
 
         self.root = root
         self.preview_folder = preview_folder
@@ -51,7 +53,11 @@ class VisualComparisonApp(customtkinter.CTk):
         self.app_status = VCInternalState()
         self.content_handler: Optional[managers.ContentManager] = None
         self.images = None
-        self.fast_load_checker = managers.FastLoadChecker()
+        self.last_frame_time = None  # For dropping frames when playback falls behind
+        self.rendered_inputs = None  # Inputs of the displayed image, see get_render_inputs
+        self.displayed_frames = None  # Full resolution frames of the displayed image
+        self.compare_position = (0, 0)  # Split position of Compare mode, in frame coordinates
+        self.concat_grid = (1, 1)  # (rows, columns) of Concat mode, see get_concat_grid
         self.icon_manager = managers.IconManager(icon_assets_path=os.path.join(assets_path, "icons"))
 
         # Create Preview Window
@@ -102,6 +108,8 @@ class VisualComparisonApp(customtkinter.CTk):
         self.display_handler = widgets.DisplayWidget(master=self)
         self.display_handler.grid(row=3, column=0)
         self.zoom_manager = managers.ZoomManager(self.display_handler)
+        self.compositor = managers.Compositor()
+        self.label_cache = utils.LabelCache()
 
         # File changing bindings
         self.bind_keys_to_buttons()
@@ -110,6 +118,7 @@ class VisualComparisonApp(customtkinter.CTk):
         self.bind(bind_copy_cmd, self.on_copy_image)
         bind_export_cmd = "<M1-s>" if platform.system() == "Darwin" else "<Control-s>"
         self.bind(bind_export_cmd, self.on_export)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Get Data
         ret = False
@@ -121,6 +130,21 @@ class VisualComparisonApp(customtkinter.CTk):
 
         self.bind_methods_to_keys()
 
+        # Thumbnails and data which are not cached are loaded in the background
+        self.poll_content()
+
+    def on_close(self):
+        """
+        Releases the loaded content and any video being exported before closing the window
+        """
+        if self.video_writer is not None:
+            self.video_writer.release()
+            self.video_writer = None
+        if self.content_handler is not None:
+            self.content_handler.close()
+            self.content_handler = None
+        self.destroy()
+
     def display_msg_popup(self, message):
         msg_popup = widgets.MessageBoxPopup(message, self.configurations["Display"]["ctk_corner_radius"])
         msg_popup.wait()
@@ -134,23 +158,95 @@ class VisualComparisonApp(customtkinter.CTk):
         root_folder, preview_folder = ret_vals
 
         require_color_conversion = any((self.configurations["Color"]["correct_h264_bt709"],))
-        content_handler = managers.ContentManager(root=root_folder, preview_folder=preview_folder, require_color_conversion=require_color_conversion)
-
-        if len(content_handler.methods) <= 1:
-            self.display_msg_popup("Root folder must contain more than 1 sub folder")
-            return False
-        if len(content_handler.files) == 0:
-            self.display_msg_popup("There are no common files in all sub folders")
+        cache_dir = os.path.expanduser(self.configurations["Cache"]["directory"]) if self.configurations["Cache"]["use_catalog"] else None
+        scan = None
+        if self.content_handler is not None and self.content_handler.can_refresh(root_folder, preview_folder, require_color_conversion):
+            # Same root selected again, only reload what has changed. Checked before the displayed content is changed.
+            content_handler = self.content_handler
+            scan = content_handler.scan()
+            methods, files = scan["methods"], scan["files"]
+        else:
+            content_handler = managers.ContentManager(
+                root=root_folder,
+                preview_folder=preview_folder,
+                require_color_conversion=require_color_conversion,
+                cache_dir=cache_dir,
+                progressive_loading=True,
+                prefetch_window=(self.configurations["Prefetch"]["files_ahead"], self.configurations["Prefetch"]["files_behind"]),
+                decode_ahead_frames=self.configurations["Playback"]["decode_ahead_frames"],
+                history_mb=self.configurations["Playback"]["history_mb"],
+                proxy_dir=os.path.join(os.path.expanduser(self.configurations["Cache"]["directory"]), "proxies") if self.configurations["Proxy"]["use_proxies"] else None,
+                proxy_height=self.configurations["Proxy"]["height"],
+                keep_high_bit_depth=self.configurations["Zoom"]["keep_high_bit_depth"],
+            )
+            methods, files = content_handler.methods, content_handler.files
+
+        error_msg = None
+        if len(methods) <= 1:
+            error_msg = "Root folder must contain more than 1 sub folder"
+        elif len(files) == 0:
+            error_msg = "There are no common files in all sub folders"
+        if error_msg is not None:
+            if content_handler is not self.content_handler:
+                content_handler.close()
+            self.display_msg_popup(error_msg)
             return False
 
+        if scan is not None:
+            content_handler.refresh(scan)
+        elif self.content_handler is not None:
+            self.content_handler.close()
+
         self.content_handler = content_handler
         self.root = root_folder
         self.preview_folder = preview_folder
+
+        if len(content_handler.ambiguous_files) > 0:
+            self.display_ambiguous_files_popup(content_handler.ambiguous_files)
         return True
 
+    def poll_content(self, interval_ms=100):
+        """
+        Pushes thumbnails loaded in the background to the preview widget and shows the loading progress.
+        Reschedules itself every interval_ms.
+        """
+        self.after(interval_ms, self.poll_content)
+
+        loaded_indices = self.content_handler.poll_loaded()
+        if len(loaded_indices) > 0:
+            # Preview widget only shows the current (e.g. filtered) files
+            positions = {file: i for i, file in enumerate(self.content_handler.current_files)}
+            files, thumbnails = self.content_handler.files, self.content_handler.thumbnails
+            images = [(positions[files[idx]], thumbnails[idx]) for idx in loaded_indices if files[idx] in positions]
+            self.preview_widget.update_images(images)
+
+        done, total = self.content_handler.loading_done, self.content_handler.loading_total
+        self.preview_widget.set_progress(done, total)
+        if self.content_handler.is_loading():
+            self.title(f"{self.content_handler.get_title()} (Loading previews {done}/{total})")
+        elif len(loaded_indices) > 0:
+            self.title(self.content_handler.get_title())
+
+    def display_ambiguous_files_popup(self, ambiguous_files, max_examples=5):
+        """
+        Informs the user about files which were skipped because their names only differ by extension.
+        :param ambiguous_files: ContentManager.ambiguous_files
+        :param max_examples: Maximum number of files to list in the message
+        """
+        examples = []
+        for method, files in ambiguous_files.items():
+            for file, paths in files.items():
+                examples.append(f"{method}/{file}: " + ", ".join(os.path.basename(path) for path in paths))
+
+        message = f"Skipped {len(examples)} file(s) sharing the same name with different extensions:\n"
+        message += "\n".join(examples[:max_examples])
+        if len(examples) > max_examples:
+            message += f"\n... and {len(examples) - max_examples} more"
+        self.display_msg_popup(message)
+
     def on_search_grid(self):
         widgets.SearchGridPopup(
-            images=self.content_handler.thumbnails,
+            get_images=self.content_handler.get_thumbnails,
             width=1000,
             height=720,
             callback=self.on_specify_index,
@@ -179,6 +275,10 @@ class VisualComparisonApp(customtkinter.CTk):
         self.bind_keys_to_buttons(prev_config)
         utils.set_appearance_mode_and_theme(new_config["Appearance"]["mode"], new_config["Appearance"]["theme"])
         utils.set_tkinter_widgets_appearance_mode(self)
+        utils.shared_image_cache.set_memory_budget(new_config["Cache"]["image_cache_mb"])
+        if self.content_handler is not None:
+            self.content_handler.set_decode_ahead(new_config["Playback"]["decode_ahead_frames"])
+            self.content_handler.set_history(new_config["Playback"]["history_mb"])
 
     def on_change_dir(self):
         self.on_pause(paused=True)
@@ -197,7 +297,7 @@ class VisualComparisonApp(customtkinter.CTk):
         self.preview_widget = widgets.PreviewWidget(master=self)
         self.preview_widget.grid(row=0, column=0)
         self.preview_widget.populate_preview_window(self.content_handler.thumbnails, self.on_specify_index)
-        self.on_specify_index(0)
+        self.on_specify_index(self.content_handler.current_index)
 
         self.cb_widget.populate_methods_button(self.content_handler.current_methods, self.on_change_mode)
         self.bind_methods_to_keys()
@@ -283,6 +383,10 @@ class VisualComparisonApp(customtkinter.CTk):
     def on_filter_files(self):
         self.on_pause(paused=True)
 
+        if len(self.content_handler.data) == 0:
+            self.display_msg_popup("File information is still loading, try again later")
+            return
+
         # Prepare data for populating popup
         row = max(self.content_handler.data, key=lambda row: len(row[1]))
         text_width = int(400./55 * len(row[1])) + 25  # Number of pixels for width
@@ -322,6 +426,7 @@ class VisualComparisonApp(customtkinter.CTk):
         new_pause_status = not self.app_status.VIDEO_PAUSED if paused is None else paused
         self.app_status.VIDEO_PAUSED = new_pause_status
         self.video_controls.pause(new_pause_status)
+        self.last_frame_time = None
 
     def on_specify_frame_no(self):
         self.on_pause(paused=True)
@@ -352,6 +457,7 @@ class VisualComparisonApp(customtkinter.CTk):
 
         value = int(value)
         self.content_handler.set_video_position(value)
+        self.last_frame_time = None
         self.video_controls.update_widget(*self.content_handler.get_video_position())
 
         ret, images = self.content_handler.read_frames()
@@ -365,6 +471,9 @@ class VisualComparisonApp(customtkinter.CTk):
         if index is None:
             current_methods_set = set(self.content_handler.current_files)
             current_data = [row for row in self.content_handler.data if row[1] in current_methods_set]
+            if len(current_data) == 0:
+                self.display_msg_popup("File information is still loading, try again later")
+                return
             for i in range(len(current_data)):
                 current_data[i][0] = i
             # Prepare data for populating popup
@@ -392,13 +501,11 @@ class VisualComparisonApp(customtkinter.CTk):
         self.content_handler.on_prev()
         self.preview_widget.highlight_selected(self.content_handler.current_index)
         self.app_status.STATE = VCState.UPDATE_FILE
-        self.fast_load_checker.update()
 
     def on_next_file(self, event: Optional[tkinter.Event] = None):
         self.content_handler.on_next()
         self.preview_widget.highlight_selected(self.content_handler.current_index)
         self.app_status.STATE = VCState.UPDATE_FILE
-        self.fast_load_checker.update()
 
     def on_change_mode(self, mode, method=None):
         if method is None:
@@ -452,7 +559,7 @@ class VisualComparisonApp(customtkinter.CTk):
         if export_format != "Video":
             raise NotImplementedError(f"Unknown option when selecting export options: {export_format}")
 
-        height, width = self.display_image.shape[:2]
+        height, width = self.get_full_resolution_image().shape[:2]
         if self.content_handler.has_video():
             _, _, video_fps = self.content_handler.get_video_position()
         else:
@@ -492,7 +599,7 @@ class VisualComparisonApp(customtkinter.CTk):
             # Cancelled
             return
         try:
-            cv2.imwrite(dialog_result.name, self.display_image)
+            cv2.imwrite(dialog_result.name, self.get_full_resolution_image())
         except cv2.error as e:
             self.display_msg_popup(e)
 
@@ -506,7 +613,7 @@ class VisualComparisonApp(customtkinter.CTk):
         # Get video information
         video_position, video_length, video_fps = self.content_handler.get_video_position()
         caps = self.content_handler.content_loaders
-        current_methods = self.content_handler.current_methods
+        current_methods = self.content_handler.loaded_methods
         width = int(caps[0].get(cv2.CAP_PROP_FRAME_WIDTH) * len(caps))
         height = int(caps[0].get(cv2.CAP_PROP_FRAME_HEIGHT))
 
@@ -518,6 +625,10 @@ class VisualComparisonApp(customtkinter.CTk):
         pbar_popup = widgets.ProgressBarPopup(total=video_length, desc="Exporting video...")
         pbar_tqdm = tqdm(total=video_length, desc="Exporting video...")
 
+        # Written from this thread, separate from the display's buffers
+        compositor = managers.Compositor()
+        label_cache = utils.LabelCache()
+
         # Write file
         while True:
             ret, images = self.content_handler.read_frames()
@@ -525,11 +636,11 @@ class VisualComparisonApp(customtkinter.CTk):
                 break
 
             # Puts text in place
-            title_positions = [utils.image_utils.TextPosition.TOP_LEFT] * len(current_methods)
-            for image, title, title_pos in zip(images, current_methods, title_positions):
-                utils.image_utils.put_text(image, title, title_pos)
+            frame = compositor.concat(images)
+            for slot, title in zip(compositor.slots, current_methods):
+                label_cache.put_text(slot, title, utils.image_utils.TextPosition.TOP_LEFT)
 
-            writer.write_image(np.hstack(images))
+            writer.write_image(frame)
 
             # Update progress bars
             pbar_popup.update_widget(1)
@@ -548,29 +659,29 @@ class VisualComparisonApp(customtkinter.CTk):
         :return: None
         """
         if hasattr(self, "display_image"):
-            utils.image_utils.image_to_clipboard(self.display_image)
+            utils.image_utils.image_to_clipboard(self.get_full_resolution_image())
 
     def display(self):
         start_time = time.time()
 
-        # Fast loading - Activates if change file button is held repeatedly (a, d, <, > keys)
-        # Prevents very long load times when has many videos/images to load and want to use buttons to switch quickly
-        if self.fast_load_checker.check(threshold_ms=self.configurations["Display"]["fast_loading_threshold_ms"]) and self.app_status.STATE == VCState.UPDATE_FILE:
-            cap = self.content_handler.load_single_file()
-            ret, display_image = cap.read()
-            self.display_handler.update_image(display_image, self.configurations["Display"]["interpolation_type"])
-            self.after(self.get_sleep_time_ms(start_time), self.display)
-            return
-
-        # Read the files when changing method or files.
+        # Files are loaded in the background when changing method or files. Previous files are shown until then.
         if self.app_status.STATE == VCState.UPDATE_FILE or self.app_status.STATE == VCState.UPDATE_METHOD:
-            self.title(self.content_handler.get_title())
-            self.content_handler.load_files()
-            self.display_handler.mouse_position = (0, 0)
+            self.content_handler.request_load()
             self.app_status.STATE = VCState.UPDATED
+
+        # Newest loaded files
+        if self.content_handler.poll_load():
+            self.title(self.content_handler.loaded_title)
+            self.label_cache.clear()
+            self.display_handler.mouse_position = (0, 0)
             self.on_pause(paused=False)
             self.zoom_manager.reset()
 
+        # Nothing loaded yet, e.g. after changing directory
+        if self.content_handler.content_loaders is None:
+            self.after(self.get_sleep_time_ms(start_time), self.display)
+            return
+
         # Show or hide video controller
         if self.content_handler.has_video():
             if len(self.video_controls.grid_info()) == 0:
@@ -581,7 +692,14 @@ class VisualComparisonApp(customtkinter.CTk):
 
         # Set video controller
         if self.content_handler.has_video() and not self.app_status.VIDEO_PAUSED:
-            self.video_controls.update_widget(*self.content_handler.get_video_position())
+            self.video_controls.update_widget(*self.content_handler.get_video_position(), self.content_handler.get_playback_stats())
+
+        # Nothing changed since the displayed image was composed
+        render_inputs = self.get_render_inputs()
+        if self.is_rendered(render_inputs):
+            self.after(self.get_sleep_time_ms(start_time), self.display)
+            return
+        self.rendered_inputs = render_inputs
 
         # Read images/videos
         if not self.content_handler.has_video():
@@ -589,65 +707,163 @@ class VisualComparisonApp(customtkinter.CTk):
         elif self.app_status.VIDEO_PAUSED:
             images = self.images
         else:
-            ret, images = self.content_handler.read_frames()
+            ret, images = self.content_handler.read_frames(drop=self.get_frames_behind())
             if not ret:
                 self.on_pause(paused=True)
                 images = self.images
             else:
                 self.images = images
 
-        # For visualization
-        images = [img.copy() for img in images]
-        current_methods = self.content_handler.current_methods
-
-        title_positions = [utils.image_utils.TextPosition.TOP_LEFT] * len(current_methods)
+        # Split position of Compare mode, kept while the mouse is out of bounds
         if self.app_status.MODE == VCModes.Compare:
-            title_positions = [utils.image_utils.TextPosition.TOP_LEFT,
-                               utils.image_utils.TextPosition.TOP_RIGHT,
-                               utils.image_utils.TextPosition.BTM_LEFT,
-                               utils.image_utils.TextPosition.BTM_RIGHT]
-
-        # Puts text in place
-        for image, title, title_pos in zip(images, current_methods, title_positions):
-            utils.image_utils.put_text(image, title, title_pos)
-
-        # Set to self.output image incase mouse is out of bounds
-        if self.app_status.MODE == VCModes.Concat:
-            comparison_img = np.hstack(images)
-            self.cropped_image = self.zoom_manager.crop_regions(images, self.configurations["Zoom"]["interpolation_type"])
-            self.output_image = self.zoom_manager.draw_regions(comparison_img, num_images=len(images))
-
-        elif self.app_status.MODE == VCModes.Specific:
-            method_idx = current_methods.index(self.app_status.METHOD)
-            comparison_img = images[method_idx]
-            self.cropped_image = self.zoom_manager.crop_regions([comparison_img], self.configurations["Zoom"]["interpolation_type"])
-            self.output_image = self.zoom_manager.draw_regions(comparison_img)
-        else:
             m_x, m_y = self.display_handler.mouse_position
             i_y, i_x = images[0].shape[:2]
             if 0 <= m_x < i_x and 0 <= m_y < i_y:
-                comparison_img = utils.image_utils.merge_multiple_images(images[:4], self.display_handler.mouse_position)
-                self.cropped_image = self.zoom_manager.crop_regions([comparison_img], self.configurations["Zoom"]["interpolation_type"])
-                self.output_image = self.zoom_manager.draw_regions(comparison_img)
+                self.compare_position = (m_x, m_y)
             elif self.app_status.STATE == VCState.UPDATE_MODE:
                 self.app_status.STATE = VCState.UPDATED
                 self.display_handler.mouse_position = (0, 0)
 
-        # Cropped image is displayed below original image
-        display_image = np.vstack([self.output_image, self.cropped_image]) if self.cropped_image is not None else self.output_image
+        # Composed at display size, unless recording the full resolution comparison
+        self.displayed_frames = images
+        self.concat_grid = self.get_concat_grid(images)
+        scale = 1.0 if self.video_writer is not None else self.get_display_scale(images)
+        display_image = self.compose_display_image(images, self.compositor, scale)
 
-        # For copy/save functionality
+        # Copy/save compose the displayed frames again at full resolution, see get_full_resolution_image
         self.display_image = display_image
 
         # For exporting video (custom)
         if self.video_writer is not None:
             self.handle_custom_video_writing(display_image)
+            self.compositor.invalidate()
 
-        self.display_handler.update_image(display_image, self.configurations["Display"]["interpolation_type"])
+        self.display_handler.update_image(display_image, self.configurations["Display"]["interpolation_type"], scale=None if self.video_writer is not None else scale)
 
         # Decide how long to sleep before calling next cycle of self.display
         self.after(self.get_sleep_time_ms(start_time), self.display)
 
+    def get_display_scale(self, images: List[np.array]) -> float:
+        """
+        :param images: Full resolution frames in display order
+        :return: Scale which fits the composed image, with the zoomed crop below it, on the screen
+        """
+        num_images = 1
+        if self.app_status.MODE == VCModes.Concat:
+            num_images = len(images)
+            rows, cols = self.concat_grid
+            height = images[0].shape[0] * rows
+            width = sum(image.shape[1] for image in images) if rows == 1 else images[0].shape[1] * cols
+        elif self.app_status.MODE == VCModes.Specific:
+            height, width = images[self.get_specific_index()].shape[:2]
+        else:
+            height, width = images[0].shape[:2]
+        crop_height = self.zoom_manager.get_crop_height(images[0].shape, width, num_images)
+        return self.display_handler.get_display_scale(width, height + crop_height, self.configurations["Display"]["interpolation_type"])
+
+    def get_concat_grid(self, images: List[np.array]) -> Tuple[int, int]:
+        """
+        Frames of the same shape are laid out in the grid which displays them largest on the screen, with the fewest
+        rows if several do. A single row if the layout is not grid or if the shapes differ.
+        :param images: Full resolution frames in display order
+        :return: (rows, columns) of Concat mode
+        """
+        num_images = len(images)
+        if self.configurations["Display"]["concat_layout"] != "grid" or any(image.shape != images[0].shape for image in images):
+            return 1, num_images
+
+        height, width = images[0].shape[:2]
+        best_grid, best_scale = (1, num_images), 0
+        for rows in range(1, num_images + 1):
+            cols = math.ceil(num_images / rows)
+            # Skip layouts with an empty row
+            if (rows - 1) * cols >= num_images:
+                continue
+            scale = self.display_handler.get_display_scale(cols * width, rows * height, self.configurations["Display"]["interpolation_type"])
+            if scale > best_scale:
+                best_grid, best_scale = (rows, cols), scale
+        return best_grid
+
+    def get_specific_index(self) -> int:
+        """
+        :return: Index of the method shown in Specific mode
+        """
+        current_methods = self.content_handler.loaded_methods
+        return current_methods.index(self.app_status.METHOD) if self.app_status.METHOD in current_methods else 0
+
+    def compose_display_image(self, images: List[np.array], compositor: managers.Compositor, scale: float) -> np.array:
+        """
+        Composes the image to display for the current mode, zoom region and split position. Frames are resized to the
+        display scale before they are composed, zoom crops are taken from full resolution frames.
+        :param images: Full resolution frames (read only) in display order
+        :param compositor: Owns the buffers of the composed image
+        :param scale: Display scale, see get_display_scale
+        :return: Composed image
+        """
+        current_methods = self.content_handler.loaded_methods
+        zoom_interpolation = self.configurations["Zoom"]["interpolation_type"]
+        scaled_images = compositor.scale_images(images, scale, self.configurations["Display"]["interpolation_type"])
+
+        # Zoom in on the original videos when paused on proxies, or on high bit depth images
+        detail_images = None
+        if (self.app_status.VIDEO_PAUSED or not self.content_handler.has_video()) and len(self.zoom_manager.zoom_bbox_pts) == 2:
+            detail_images = self.content_handler.read_detail_frames()
+
+        self.zoom_manager.grid_shape = self.concat_grid if self.app_status.MODE == VCModes.Concat else (1, 1)
+        if self.app_status.MODE == VCModes.Concat:
+            comparison_img = compositor.concat(scaled_images, self.concat_grid)
+            cropped_image = self.zoom_manager.crop_regions(images, zoom_interpolation, detail_images, output_width=comparison_img.shape[1])
+            for slot, title in zip(compositor.slots, current_methods):
+                self.label_cache.put_text(slot, title, utils.image_utils.TextPosition.TOP_LEFT)
+            comparison_img = self.zoom_manager.draw_regions(comparison_img, num_images=len(images), scale=scale)
+
+        elif self.app_status.MODE == VCModes.Specific:
+            method_idx = self.get_specific_index()
+            detail_images = [detail_images[method_idx]] if detail_images is not None else None
+            comparison_img = compositor.single(scaled_images[method_idx])
+            cropped_image = self.zoom_manager.crop_regions([images[method_idx]], zoom_interpolation, detail_images, output_width=comparison_img.shape[1])
+            self.label_cache.put_text(comparison_img, current_methods[method_idx], utils.image_utils.TextPosition.TOP_LEFT)
+            comparison_img = self.zoom_manager.draw_regions(comparison_img, scale=scale)
+
+        else:
+            i_y, i_x = images[0].shape[:2]
+            d_y, d_x = scaled_images[0].shape[:2]
+            m_x, m_y = self.compare_position
+            position = (min(int(m_x * scale), d_x - 1), min(int(m_y * scale), d_y - 1))
+            comparison_img = compositor.compare(scaled_images, position)
+
+            # Only the zoomed region is composed at full resolution
+            cropped_image = None
+            crop_sources = detail_images if detail_images is not None else images
+            crop_scale = crop_sources[0].shape[0] / i_y
+            crop_bounds = self.zoom_manager.get_crop_bounds(images[0].shape, crop_scale)
+            if crop_bounds is not None:
+                c_y, c_x = crop_sources[0].shape[:2]
+                crop_position = (min(int(m_x * crop_scale), c_x - 1), min(int(m_y * crop_scale), c_y - 1))
+                merged = compositor.merge_region(crop_sources, crop_position, crop_bounds)
+                cropped_image = self.zoom_manager.crop_regions([images[0]], zoom_interpolation, [merged], output_width=comparison_img.shape[1])
+
+            title_positions = [utils.image_utils.TextPosition.TOP_LEFT,
+                               utils.image_utils.TextPosition.TOP_RIGHT,
+                               utils.image_utils.TextPosition.BTM_LEFT,
+                               utils.image_utils.TextPosition.BTM_RIGHT]
+            if len(images) > 4:
+                title_positions = utils.image_utils.get_sector_anchors(len(images), d_x, d_y, position)
+            for title, title_pos in zip(current_methods, title_positions):
+                compositor.mark_dirty(self.label_cache.put_text(comparison_img, title, title_pos))
+            comparison_img = self.zoom_manager.draw_regions(comparison_img, scale=scale)
+            if len(self.zoom_manager.zoom_bbox_pts) > 0 or self.zoom_manager.error_message != "":
+                compositor.invalidate()
+
+        # Cropped image is displayed below original image
+        return compositor.stack(comparison_img, cropped_image)
+
+    def get_full_resolution_image(self) -> np.array:
+        """
+        :return: Displayed comparison composed at the resolution of the frames, for exporting
+        """
+        return self.compose_display_image(self.displayed_frames, managers.Compositor(), 1.0)
+
     def reset_video_writer(self):
         self.video_writer.release()
         self.video_writer = None
@@ -670,8 +886,8 @@ class VisualComparisonApp(customtkinter.CTk):
 
             # Show playback progress on video
             if self.video_writer_options.get("render_video_frames_num", None):
-                utils.image_utils.put_text(img_to_write, str(video_position), utils.image_utils.TextPosition.MIDDLE_LEFT, fg_color=(255, 255, 255))
-                utils.image_utils.put_text(img_to_write, str(video_length), utils.image_utils.TextPosition.MIDDLE_RIGHT, fg_color=(255, 255, 255))
+                self.label_cache.put_text(img_to_write, str(video_position), utils.image_utils.TextPosition.MIDDLE_LEFT, fg_color=(255, 255, 255))
+                self.label_cache.put_text(img_to_write, str(video_length), utils.image_utils.TextPosition.MIDDLE_RIGHT, fg_color=(255, 255, 255))
 
         ret = self.video_writer.write_image(img_to_write)
         if not ret:
@@ -679,7 +895,61 @@ class VisualComparisonApp(customtkinter.CTk):
             self.display_msg_popup("Video writing stopped because image size has changed")
 
         # Inform user that it is still recording
-        utils.image_utils.put_text(img_to_write, "Recording", utils.image_utils.TextPosition.TOP_CENTER, fg_color=(0, 0, 255))
+        self.label_cache.put_text(img_to_write, "Recording", utils.image_utils.TextPosition.TOP_CENTER, fg_color=(0, 0, 255))
+
+    def get_render_inputs(self) -> Optional[Tuple[tuple, tuple]]:
+        """
+        Inputs which determine the displayed image, so that it is only composed again when one of them changes.
+        :return: (sources, state) or None if every cycle is rendered (video playback or export). Sources are compared
+            by identity (loaded files, paused frames, configurations), state by value.
+        """
+        if self.video_writer is not None or (self.content_handler.has_video() and not self.app_status.VIDEO_PAUSED):
+            return None
+
+        paused_frames = self.images if self.content_handler.has_video() else None
+        sources = (self.content_handler.content_loaders, paused_frames, self.configurations)
+        state = (
+            self.app_status.MODE,
+            self.app_status.METHOD,
+            self.display_handler.mouse_position if self.app_status.MODE == VCModes.Compare else None,
+            tuple(self.zoom_manager.zoom_bbox_pts),
+            self.zoom_manager.zoom_box_frozen,
+            self.zoom_manager.error_message,
+        )
+        return sources, state
+
+    def is_rendered(self, render_inputs: Optional[Tuple[tuple, tuple]]) -> bool:
+        """
+        :param render_inputs: From get_render_inputs
+        :return: True if the displayed image was composed from the same inputs
+        """
+        if render_inputs is None or self.rendered_inputs is None:
+            return False
+        (sources, state), (prev_sources, prev_state) = render_inputs, self.rendered_inputs
+        return all(source is prev_source for source, prev_source in zip(sources, prev_sources)) and state == prev_state
+
+    def get_target_fps(self) -> float:
+        """
+        :return: max_fps if displaying images, otherwise the video fps scaled by the playback rate (up to max_fps)
+        """
+        target_fps = self.configurations["Functionality"]["max_fps"]
+        if self.content_handler.has_video():
+            target_fps = self.content_handler.get_video_position()[2] * self.app_status.VIDEO_PLAYBACK_RATE
+            target_fps = min(target_fps, self.configurations["Functionality"]["max_fps"])
+        return target_fps
+
+    def get_frames_behind(self) -> int:
+        """
+        Number of video frames which should have been displayed since the previous one at the target fps, so that
+        playback drops frames instead of slowing down when a tick takes too long. No frames are dropped while
+        exporting, so that the exported video has every frame.
+        :return: Number of frames to drop
+        """
+        now = time.time()
+        last_frame_time, self.last_frame_time = self.last_frame_time, now
+        if last_frame_time is None or self.video_writer is not None:
+            return 0
+        return max(0, int((now - last_frame_time) * self.get_target_fps()) - 1)
 
     def get_sleep_time_ms(self, start_time: float):
         """
@@ -698,10 +968,7 @@ class VisualComparisonApp(customtkinter.CTk):
             return 500
 
         # Calculate T = 1/f, time budget for video playback
-        target_fps = self.configurations["Functionality"]["max_fps"]
-        if self.content_handler.has_video():
-            target_fps = self.content_handler.get_video_position()[2] * self.app_status.VIDEO_PLAYBACK_RATE
-            target_fps = min(target_fps, self.configurations["Functionality"]["max_fps"])
+        target_fps = self.get_target_fps()
         target_period_s = 1.0 / target_fps
 
         # Find offset time
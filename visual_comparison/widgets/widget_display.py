@@ -22,28 +22,42 @@ class DisplayWidget(customtkinter.CTkFrame):
         self.image_label.bind("<Motion>", self.on_mouse_move)
         self.scale = 1
 
-    def update_image(self, image: np.array, interpolation: Optional[int]):
+    def get_display_scale(self, width: int, height: int, interpolation: Optional[int]) -> float:
+        """
+        :param width: Width of the image to display
+        :param height: Height of the image to display
+        :param interpolation: cv2 interpolation type, images are not resized if None
+        :return: Scale which fits the image on the screen, 1 if it already fits
+        """
+        if interpolation is None:
+            return 1
+
+        # Different systems have different borders which use part of the screen for their display (dock etc)
+        h_multiplier = 0.75 if platform.system() == "Darwin" else 0.8
+        screen_h, screen_w = self.master.winfo_screenheight() * h_multiplier, self.master.winfo_screenwidth()
+        if width > screen_w or height > screen_h:
+            return 1 / max(width / screen_w, height / screen_h)
+        return 1
+
+    def update_image(self, image: np.array, interpolation: Optional[int], scale: Optional[float] = None):
         """
         Update display widget with new image
         :param image: Image to display
         :param interpolation: cv2 interpolation type. E.g. cv2.INTER_NEAREST, cv2.INTER_LINEAR
+        :param scale: [Optional] Scale the image was already resized by to fit the screen, see get_display_scale.
+            The image is fitted to the screen here if None.
         :return:
         """
         image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         h, w, _ = image.shape
 
-        # Different systems have different borders which use part of the screen for their display (dock etc)
-        if interpolation is None:
-            self.scale = 1
+        if scale is not None:
+            self.scale = scale
         else:
-            h_multiplier = 0.75 if platform.system() == "Darwin" else 0.8
-            screen_h, screen_w = self.master.winfo_screenheight() * h_multiplier, self.master.winfo_screenwidth()
-            if w > screen_w or h > screen_h:
-                self.scale = 1 / max(w / screen_w, h / screen_h)
+            self.scale = self.get_display_scale(w, h, interpolation)
+            if self.scale != 1:
                 image = image_utils.resize_scale(image, scale=self.scale, interpolation=interpolation)
                 h, w, _ = image.shape
-            else:
-                self.scale = 1
 
         pil_image = Image.fromarray(image)
         ctk_image = customtkinter.CTkImage(light_image=pil_image, size=(w, h))
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Tuple
 
 import numpy as np
 import tkinter
@@ -46,6 +46,9 @@ class PreviewWidget(customtkinter.CTkFrame):
 
         self.canvas_viewport.grid(row=0, sticky="nsew")
 
+        # Only shown while thumbnails are being loaded
+        self.progress_bar = customtkinter.CTkProgressBar(self, height=4)
+
     def _bound_to_mousewheel(self, event):
         if self.tk.call("tk", "windowingsystem") == "x11":
             self.canvas_viewport.bind_all("<Button-4>", self._on_mousewheel)
@@ -83,6 +86,28 @@ class PreviewWidget(customtkinter.CTkFrame):
         # Visualize
         self.highlight_selected(0)
 
+    def update_images(self, images: List[Tuple[int, np.array]]) -> None:
+        """
+        Replaces the images of existing buttons, e.g. placeholders once thumbnails are loaded
+        :param images: List of (button index, image)
+        """
+        for i, image in images:
+            photo_img = PhotoImage(PIL.Image.fromarray(image))
+            self.buttons[i].configure(image=photo_img)
+            self.buttons[i].image = photo_img
+
+    def set_progress(self, done: int, total: int) -> None:
+        """
+        Shows a progress bar below the previews until done reaches total
+        """
+        if done >= total:
+            self.progress_bar.grid_forget()
+            return
+
+        if len(self.progress_bar.grid_info()) == 0:
+            self.progress_bar.grid(row=1, sticky="ew")
+        self.progress_bar.set(done / total)
+
     def get_index_min_max(self, index):
         minimum = max(0, index - self.view_radius)
         maximum = min(len(self.buttons), index + self.view_radius + 1)
@@ -1,10 +1,11 @@
-from typing import List, Union
+from typing import Callable, List, Union
 
 from PIL import Image
 from PIL.ImageTk import PhotoImage
 import tkinter
 import customtkinter
 import cv2
+import numpy as np
 
 from ..utils import shift_widget_to_root_center
 
@@ -15,12 +16,15 @@ __all__ = [
 
 
 class SearchGridPopup(customtkinter.CTkToplevel):
-    def __init__(self, images, width: int, height: int, callback, default_value, *args, **kwargs):
+    def __init__(self, get_images: Callable[[int], List[np.array]], width: int, height: int, callback, default_value, *args, **kwargs):
+        """
+        :param get_images: Returns the images to place in the buttons, for a given row height
+        """
         super().__init__(*args, **kwargs)
         self.geometry(f"{width}x{height}")
 
         # Internal variables
-        self.images = images
+        self.get_images = get_images
         self.width = width
         self.previous_width = width
         self.rows = []
@@ -94,8 +98,7 @@ class SearchGridPopup(customtkinter.CTkToplevel):
     ) -> None:
         """
         Load content
-        :param images: List of images to place in button
-        :param callback: Callback for button when clicked
+        :param border: Border around each button
         :param row_height: Height of each row in the image
         """
         # Destroy previous buttons
@@ -112,7 +115,7 @@ class SearchGridPopup(customtkinter.CTkToplevel):
         self.rows = [first_row]
         row_count, row_width = 0, 0
 
-        for i, image in enumerate(self.images):
+        for i, image in enumerate(self.get_images(row_height)):
             # Resize image to new size if not there yet
             h, w, c = image.shape
             if h != row_height:
@@ -1,4 +1,6 @@
 import time
+from typing import Optional
+
 import customtkinter
 
 
@@ -28,7 +30,7 @@ class VideoControlsWidget(customtkinter.CTkFrame):
         playback_speeds = ["1x", "1.5x", "2x", "3x", "4x", "Max"]
         playback_button = customtkinter.CTkOptionMenu(self, width=50, height=height, values=playback_speeds, command=callbacks["on_change_playback_rate"], corner_radius=ctk_corner_radius)
         playback_button.grid(row=0, column=8, padx=2)
-        self.label_fps = customtkinter.CTkLabel(master=self, width=180, height=height)
+        self.label_fps = customtkinter.CTkLabel(master=self, width=320, height=height)
         self.label_fps.grid(row=0, column=9, padx=2)
 
         # To calculate playback fps
@@ -46,7 +48,7 @@ class VideoControlsWidget(customtkinter.CTkFrame):
         playback_fps = -1 if time_diff_s == 0 else len(self.last_called) / time_diff_s
         return playback_fps
 
-    def update_widget(self, current_frame_number, total_frame_number, video_fps):
+    def update_widget(self, current_frame_number, total_frame_number, video_fps, playback_stats: Optional[dict] = None):
         slider_position = current_frame_number / total_frame_number * 100
         self.video_slider.set(slider_position)
         self.button_specify_frame_no.configure(text=f"{current_frame_number} / {int(total_frame_number)}")
@@ -56,4 +58,6 @@ class VideoControlsWidget(customtkinter.CTkFrame):
             self.last_called.pop(0)
         playback_fps = self.get_playback_fps()
         label_string = f"Vid:{str(round(video_fps, 1)).rjust(5)}fps | Play:{str(round(playback_fps, 1)).rjust(5)}fps"
+        if playback_stats is not None and playback_stats["buffer_size"] > 0:
+            label_string += f" | Buf:{playback_stats['buffered']}/{playback_stats['buffer_size']} Late:{playback_stats['late_frames']} Drop:{playback_stats['dropped_frames']}"
         self.label_fps.configure(text=label_string)